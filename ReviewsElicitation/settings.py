@@ -24,7 +24,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # outermost, to time all of each process's first request
+    'main.middleware.FirstRequestTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'main.middleware.IdentityMapMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -37,11 +40,18 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'ReviewsElicitation.urls'
 
+# compiled templates are kept in memory per process unless TEMPLATE_CACHE=False,
+# which re-reads them on every render while editing them (the default with DEBUG)
+TEMPLATE_CACHE = os.getenv('TEMPLATE_CACHE', str(not DEBUG)) == 'True'
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
@@ -49,11 +59,13 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            'loaders': [('django.template.loaders.cached.Loader', TEMPLATE_LOADERS)] if TEMPLATE_CACHE else TEMPLATE_LOADERS,
         },
     },
 ]
 
 WSGI_APPLICATION = 'ReviewsElicitation.wsgi.application'
+ASGI_APPLICATION = 'ReviewsElicitation.asgi.application'
 
 if DEBUG:
     DATABASES = {
@@ -71,6 +83,9 @@ if DEBUG:
     MEDIA_URL = '/media/'
     MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+    # where the resized profile images are kept (see main/thumbnails.py)
+    PROFILE_IMAGE_STORAGE = os.getenv('PROFILE_IMAGE_STORAGE', 'django.core.files.storage.FileSystemStorage')
+
 ##### DEPLOYMENT CHANGES #####
 else:
     import dj_database_url
@@ -80,8 +95,9 @@ else:
 
     INSTALLED_APPS.append('cloudinary')
 
-    MIDDLEWARE.append('whitenoise.middleware.WhiteNoiseMiddleware')
-    MIDDLEWARE.append('django.middleware.security.SecurityMiddleware')
+    # right after SecurityMiddleware, as WhiteNoise asks; an async-capable
+    # subclass, so that the async views stay on the event loop under ASGI
+    MIDDLEWARE.insert(MIDDLEWARE.index('django.middleware.security.SecurityMiddleware') + 1, 'main.middleware.StaticFilesMiddleware')
 
     DATABASES = {
         'default': dj_database_url.parse(os.getenv('DATABASE_URL'))
@@ -91,8 +107,10 @@ else:
     MEDIA_URL = '/media/'
 
     STATIC_ROOT = BASE_DIR / 'staticfiles'
-    STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+    # fingerprinted, gzip and brotli precompressed, and served by WhiteNoise with far-future cache headers
+    STATICFILES_STORAGE = 'main.assets.MinifiedManifestStaticFilesStorage'
     MEDIA_ROOT = BASE_DIR / 'media'
+    PROFILE_IMAGE_STORAGE = os.getenv('PROFILE_IMAGE_STORAGE', 'main.storage.CloudinaryStorage')
 
     cloudinary.config(
         cloud_name = os.getenv('CLOUDINARY_CLOUD_NAME'),
@@ -101,6 +119,49 @@ else:
     )
 ##### END OF DEPLOYMENT CHANGES #####
 
+# e.g. CACHE_BACKEND=django.core.cache.backends.redis.RedisCache and
+# CACHE_LOCATION=redis://... to share rendered fragments between workers
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'reviews-elicitation'),
+    }
+}
+
+# a per-process cache only hears of the saves made in its own process, so with
+# several workers what it keeps has to expire within seconds to stay current
+CACHE_IS_SHARED = CACHES['default']['BACKEND'] != 'django.core.cache.backends.locmem.LocMemCache'
+
+# seconds a profile header stays cached (see main/profile_headers.py); saves
+# invalidate it, but only for every worker with a shared CACHE_BACKEND
+PROFILE_HEADER_CACHE_TIMEOUT = int(os.getenv('PROFILE_HEADER_CACHE_TIMEOUT', 60 * 60 if CACHE_IS_SHARED else 10))
+
+# buffer vote clicks in memory and write them in batches every interval seconds
+# (see main/vote_buffer.py); off by default
+VOTE_BUFFER = os.getenv('VOTE_BUFFER', 'False') == 'True'
+VOTE_BUFFER_INTERVAL = float(os.getenv('VOTE_BUFFER_INTERVAL', 1))
+
+# where profile image uploads wait for the process_image_jobs worker; must be
+# on a disk the worker shares with the web processes
+IMAGE_STAGING_ROOT = os.getenv('IMAGE_STAGING_ROOT', os.path.join(BASE_DIR, 'staging'))
+
+# seconds the user behind a session stays cached (see main/session_users.py);
+# saves invalidate it, but only for every worker (and the process_image_jobs
+# worker's image switches) with a shared CACHE_BACKEND. 0 turns it off
+SESSION_USER_CACHE_TIMEOUT = int(os.getenv('SESSION_USER_CACHE_TIMEOUT', 60 if CACHE_IS_SHARED else 10))
+
+# where sessions are kept: db (default), cached_db (the table behind the cache),
+# cache (no table; needs a shared CACHE_BACKEND with several workers) or
+# signed_cookies (no server-side state). Expired rows of the db modes are
+# removed by `manage.py clear_expired_sessions`
+SESSION_MODE = os.getenv('SESSION_MODE', 'db')
+SESSION_ENGINE = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'cache': 'django.contrib.sessions.backends.cache',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}[SESSION_MODE]
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -134,9 +195,11 @@ LOGIN_URL = '/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
-EMAIL_HOST = 'smtp.gmail.com'
+# mail is queued by requests and sent by `manage.py send_queued_mail`; point these
+# at the console/locmem backend or a local SMTP server to try that out
+EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
+EMAIL_HOST = os.getenv('EMAIL_HOST', 'smtp.gmail.com')
 EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD')
-EMAIL_PORT = 587
-EMAIL_USE_TLS = True
+EMAIL_PORT = int(os.getenv('EMAIL_PORT', 587))
+EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS', 'True') == 'True'
@@ -0,0 +1,15 @@
+# Read by gunicorn from the directory it is started in.
+import logging
+
+
+def post_worker_init(worker):
+    # the app is loaded in the worker by now; compile its templates before it takes requests
+    from main import warmup
+
+    # into gunicorn's log: the warmup below and, from main.middleware, the first request
+    logger = logging.getLogger('main')
+    logger.setLevel(logging.INFO)
+    for handler in worker.log.error_log.handlers:
+        logger.addHandler(handler)
+
+    warmup.warm_templates()
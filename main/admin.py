@@ -1,5 +1,21 @@
 from django.contrib import admin
 from . import models
 
+
+@admin.register(models.OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    # the body holds one-time passwords and reset links
+    list_display = ('subject', 'recipients', 'status', 'attempts', 'created', 'sent')
+    list_filter = ('status',)
+    exclude = ('body',)
+    readonly_fields = ('subject', 'is_html', 'from_email', 'to', 'status', 'attempts', 'next_attempt', 'last_error', 'created', 'sent')
+
+    @admin.display(description='To')
+    def recipients(self, email):
+        return ', '.join(email.to)
+
+
 admin.site.register(models.UserProfile)
-admin.site.register(models.Review)
\ No newline at end of file
+admin.site.register(models.Review)
+admin.site.register(models.ImageJob)
+admin.site.register(models.ImageBlob)
@@ -0,0 +1,163 @@
+import re
+
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+# strings and comments, which the CSS minifier must not look inside of
+CSS_TOKENS = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')|(/\*.*?\*/)', re.S)
+
+
+def minify_css(css):
+    """Drops comments and the whitespace that CSS doesn't need."""
+    parts = []
+    for index, piece in enumerate(CSS_TOKENS.split(css)):
+        kind = index % 3
+        if piece is None or kind == 2:
+            continue
+        if kind == 0:
+            piece = re.sub(r'\s+', ' ', piece)
+            piece = re.sub(r'\s*([{};,])\s*', r'\1', piece)
+            # not before the colon, where a space in a selector means a descendant
+            piece = re.sub(r':\s+', ':', piece)
+            piece = piece.replace(';}', '}')
+        parts.append(piece)
+    return ''.join(parts).strip()
+
+
+# words after which a / starts a regex rather than a division
+REGEX_KEYWORDS = {
+    'return', 'typeof', 'instanceof', 'in', 'of', 'new', 'delete', 'void',
+    'throw', 'case', 'do', 'else', 'yield', 'await',
+}
+JS_WORD = re.compile(r'[\w$]+')
+
+
+def _regex_allowed(last):
+    if not last or last in REGEX_KEYWORDS:
+        return True
+    return not (JS_WORD.fullmatch(last) or last in ')]')
+
+
+def _js_line_states(js):
+    """
+    Scans `js` and returns, for each of its '\n'-separated lines, the states
+    it starts and ends in: 'code', a quote character for a string or template
+    literal, 'regex', 'block_comment' or 'line_comment'.
+    """
+    states = []
+    state = line_start = 'code'
+    # open braces per nesting level; each ${ in a template literal starts a level
+    braces = [0]
+    # the last word or punctuation in code, to tell a regex from a division
+    last = ''
+    i, length = 0, len(js)
+    while i < length:
+        char = js[i]
+        if char == '\n':
+            states.append((line_start, state))
+            if state == 'line_comment':
+                state = 'code'
+            line_start = state
+        elif char == '\\' and state not in ('code', 'line_comment', 'block_comment'):
+            # an escaped line break still ends the line
+            i += 1 if js[i + 1:i + 2] == '\n' else 2
+            continue
+        elif state == 'code':
+            if char in '\'"`':
+                state = char
+            elif js.startswith('//', i):
+                state = 'line_comment'
+            elif js.startswith('/*', i):
+                state = 'block_comment'
+                i += 2
+                continue
+            elif char == '/' and _regex_allowed(last):
+                state = 'regex'
+            elif char == '}' and braces[-1] == 0 and len(braces) > 1:
+                braces.pop()
+                state = '`'
+            elif JS_WORD.match(char):
+                word = JS_WORD.match(js, i)
+                last = word.group()
+                i = word.end()
+                continue
+            elif not char.isspace():
+                if char == '{':
+                    braces[-1] += 1
+                elif char == '}':
+                    braces[-1] -= 1
+                last = char
+        elif state == 'block_comment':
+            if js.startswith('*/', i):
+                state = 'code'
+                i += 2
+                continue
+        elif state == 'regex':
+            if char == '[':
+                state = 'regex_class'
+            elif char == '/':
+                state = 'code'
+                # a literal is an operand, so a / right after it divides
+                last = 'literal'
+        elif state == 'regex_class':
+            if char == ']':
+                state = 'regex'
+        elif state == '`' and js.startswith('${', i):
+            braces.append(0)
+            state = 'code'
+            last = '{'
+            i += 2
+            continue
+        elif char == state:
+            state = 'code'
+            last = 'literal'
+        i += 1
+    states.append((line_start, state))
+    return states
+
+
+def minify_js(js):
+    """
+    Strips indentation, trailing whitespace, blank lines and whole-line //
+    comments. Lines are scanned for strings, template literals, regexes and
+    comments first, so whitespace inside any of them is left alone.
+    """
+    lines = []
+    for line, (start, end) in zip(js.split('\n'), _js_line_states(js)):
+        if start == 'code':
+            line = line.lstrip()
+            if not line or line.startswith('//'):
+                continue
+        if end in ('code', 'line_comment'):
+            line = line.rstrip()
+        lines.append(line)
+    return '\n'.join(lines) + '\n'
+
+
+MINIFIERS = {
+    '.css': minify_css,
+    '.js': minify_js,
+}
+
+
+class MinifiedManifestStaticFilesStorage(CompressedManifestStaticFilesStorage):
+    """
+    WhiteNoise's fingerprinting and gzip/brotli precompression, with this
+    app's own stylesheets and scripts minified first, so the hashes and the
+    compressed copies are of the minified files.
+    """
+    minify_prefixes = ('styles/', 'scripts/')
+
+    def post_process(self, paths, dry_run=False, **options):
+        if not dry_run:
+            paths = dict(paths)
+            for path, (storage, source_path) in list(paths.items()):
+                minify = MINIFIERS.get(path[path.rfind('.'):])
+                if minify and path.startswith(self.minify_prefixes):
+                    with storage.open(source_path) as file:
+                        source = file.read().decode('utf-8')
+                    with open(self.path(path), 'w', encoding='utf-8') as file:
+                        file.write(minify(source))
+                    # hashed from the minified copy rather than the app's source
+                    paths[path] = (self, path)
+
+        yield from super().post_process(paths, dry_run=dry_run, **options)
@@ -1,6 +1,8 @@
 from django.contrib.auth.backends import ModelBackend
 from django.contrib.auth import get_user_model
 
+from . import session_users
+
 User = get_user_model()
 
 class EmailBackend(ModelBackend):
@@ -16,6 +18,6 @@ class EmailBackend(ModelBackend):
 
     def get_user(self, user_id):
         try:
-            return User.objects.get(pk=user_id)
+            return session_users.get_user(user_id)
         except User.DoesNotExist:
             return None
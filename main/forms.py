@@ -1,11 +1,18 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm, PasswordChangeForm
 from django.contrib.auth.models import User
-from django.core.mail import send_mail
+from django.utils.crypto import salted_hmac
+from . import image_jobs
 from . import models
+from . import outbox
+from . import search
+from .mutations import save_changed
 from ReviewsElicitation.settings import EMAIL_HOST_USER
 import random
-from django.conf import settings
+
+def otp_digest(otp):
+    return salted_hmac('main.forms.otp', str(otp)).hexdigest()
+
 
 class CustomUserCreationForm(UserCreationForm):
     first_name = forms.CharField(max_length=30, required=True, widget=forms.TextInput(attrs={'placeholder': 'First Name'}))
@@ -35,14 +42,14 @@ class CustomUserCreationForm(UserCreationForm):
     def send_otp_email(self, request):
         email = self.cleaned_data['email']
         otp = random.randint(100000, 999999)
-        request.session['otp'] = otp
+        # only a keyed digest goes into the session, which may be a cookie
+        request.session['otp'] = otp_digest(otp)
 
-        send_mail(
+        outbox.enqueue(
             'OTP Verification - Talent Hunt',
             f'Your one-time-password for registration is {otp}. Please refrain from sharing it with anyone.',
-            EMAIL_HOST_USER,
             [email],
-            fail_silently=False,
+            from_email=EMAIL_HOST_USER,
         )
 
         print(otp)
@@ -75,6 +82,7 @@ class CustomAuthenticationForm(forms.Form):
 
         self.fields['email'].help_text = ''
         self.fields['password'].help_text = ''
+        self.user_cache = None
 
     def clean(self):
         email = self.cleaned_data.get('email')
@@ -85,8 +93,15 @@ class CustomAuthenticationForm(forms.Form):
             raise forms.ValidationError("This email id is not registered.")
         if not user.check_password(password):
             raise forms.ValidationError("The password entered is either incorrect or invalid.")
+
+        # already verified here, so the view logs the user in without authenticate()
+        # hashing the password a second time
+        self.user_cache = user
         return self.cleaned_data
 
+    def get_user(self):
+        return self.user_cache
+
 
 class OTPVerificationForm(forms.Form):
     otp = forms.CharField(min_length=6, max_length=6, required=True, widget=forms.TextInput(attrs={'placeholder': 'Enter OTP'}))
@@ -97,18 +112,13 @@ class OTPVerificationForm(forms.Form):
 
 
 class ProfileForm(forms.ModelForm):
-    if settings.DEBUG:
-        profile_image = forms.ImageField(required=False, widget=forms.FileInput)
-
-    ### deployment changes in media file field ###
-    else:
-        from cloudinary.forms import CloudinaryFileField
-        profile_image = CloudinaryFileField(required=False, widget=forms.FileInput)
-    ### end of deployment changes ###
+    # a plain upload in every deployment: the file is staged locally and the
+    # process_image_jobs worker resizes it and pushes it to the storage
+    profile_image = forms.ImageField(required=False, widget=forms.FileInput)
 
     class Meta:
         model = models.UserProfile
-        fields = ['profile_image']
+        fields = []
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -120,24 +130,32 @@ class ProfileForm(forms.ModelForm):
     def save(self, commit=True):
         instance = super().save(commit=False)
 
-        if settings.DEBUG:
+        if commit:
+            if instance._state.adding:
+                instance.save()
             if self.cleaned_data.get('remove_photo'):
-                instance.profile_image.delete()
-                instance.profile_image = None
+                image_jobs.remove(instance)
+            elif self.cleaned_data.get('profile_image'):
+                image_jobs.enqueue_upload(instance, self.cleaned_data['profile_image'])
 
-        ### deployment changes to handle media file deletion ###
-        else:
-            from cloudinary import uploader
-            if self.cleaned_data.get('remove_photo'):
-                if instance.profile_image:
-                    uploader.destroy(instance.profile_image.public_id)
-                instance.profile_image = None
-        ### end of deployment changes ###
+        return instance
 
-        if commit:
-            instance.save()
 
-        return instance
+def _profile_of(user):
+    # user.userprofile is cached on the instance, so views and forms share one load
+    try:
+        return user.userprofile
+    except models.UserProfile.DoesNotExist:
+        return models.UserProfile(user=user)
+
+
+def _save_profile(profile, **values):
+    if profile._state.adding:
+        for name, value in values.items():
+            setattr(profile, name, value)
+        profile.save()
+    else:
+        save_changed(profile, **values)
 
 
 class ProfileDetailsForm(forms.Form):
@@ -156,6 +174,7 @@ class ProfileDetailsForm(forms.Form):
     def __init__(self, *args, **kwargs):
         user = kwargs.pop('user')
         self.user = user
+        self.profile = _profile_of(user) if user else None
 
         super().__init__(*args, **kwargs)
         self.fields['first_name'].label = 'First Name'
@@ -167,9 +186,8 @@ class ProfileDetailsForm(forms.Form):
             self.fields['first_name'].initial = user.first_name
             self.fields['last_name'].initial = user.last_name
 
-            profile = models.UserProfile.objects.get(user=user)
-            self.fields['contact_number'].initial = profile.contact_number
-            self.fields['gender'].initial = profile.gender
+            self.fields['contact_number'].initial = self.profile.contact_number
+            self.fields['gender'].initial = self.profile.gender
 
     def clean_contact_number(self):
         contact_number = self.cleaned_data['contact_number']
@@ -183,15 +201,12 @@ class ProfileDetailsForm(forms.Form):
         return contact_number
     
     def save(self, user):
-        user.first_name = self.cleaned_data['first_name']
-        user.last_name = self.cleaned_data['last_name']
-        user.save()
-
-        profile = models.UserProfile.objects.get(user=user)
+        old_names = [user.first_name, user.last_name]
+        if save_changed(user, first_name=self.cleaned_data['first_name'], last_name=self.cleaned_data['last_name']):
+            search.invalidate_suggestions(user, old_names + [user.first_name, user.last_name])
 
-        profile.contact_number = self.cleaned_data['contact_number']
-        profile.gender = self.cleaned_data['gender']
-        profile.save()
+        profile = self.profile if user == self.user else _profile_of(user)
+        _save_profile(profile, contact_number=self.cleaned_data['contact_number'], gender=self.cleaned_data['gender'])
 
 
 class BioForm(forms.Form):
@@ -202,13 +217,11 @@ class BioForm(forms.Form):
         super().__init__(*args, **kwargs)
 
         self.fields['bio'].label = ''
-        self.fields['bio'].initial = user.userprofile.bio
+        self.fields['bio'].initial = _profile_of(user).bio
         self.fields['bio'].widget.attrs['class'] = 'bio-textarea'
 
     def save(self, user):
-        profile = models.UserProfile.objects.get(user=user)
-        profile.bio = self.cleaned_data['bio']
-        profile.save()
+        _save_profile(_profile_of(user), bio=self.cleaned_data['bio'])
 
 
 class ReviewForm(forms.ModelForm):
@@ -238,16 +251,25 @@ class ReviewForm(forms.ModelForm):
 
     def clean(self):
         cleaned_data = super().clean()
-        to_username = self.instance.to_user
-        from_username = self.instance.from_user
+        to_user_id = self.instance.to_user_id
+        from_user_id = self.instance.from_user_id
 
-        existing_review = models.Review.objects.filter(to_user=to_username, from_user=from_username).exclude(id=self.instance.id)
+        existing_review = models.Review.objects.filter(to_user_id=to_user_id, from_user_id=from_user_id).exclude(id=self.instance.id)
 
         if existing_review:
             raise forms.ValidationError('You have already reviewed this user!')
         
         return cleaned_data
 
+    def save(self, commit=True):
+        # an existing review only writes the fields the form changed
+        if not commit or self.instance._state.adding:
+            return super().save(commit)
+
+        review = super().save(commit=False)
+        review.save(update_fields=[name for name in self.changed_data if name in self._meta.fields])
+        return review
+
         
 class CustomPasswordChangeForm(PasswordChangeForm):
     old_password = forms.CharField(required=True, widget=forms.PasswordInput(attrs={'placeholder': 'Old Password', 'class':'pass'}))
@@ -0,0 +1,54 @@
+from contextvars import ContextVar
+
+from django.contrib.auth.models import User
+
+_identity_map = ContextVar('identity_map', default=None)
+
+
+class IdentityMap:
+    """The users loaded during one request, by pk and by username."""
+
+    def __init__(self):
+        self.by_pk = {}
+        self.by_username = {}
+
+    def add(self, user):
+        user = self.by_pk.setdefault(user.pk, user)
+        self.by_username[user.username] = user
+        return user
+
+
+def activate():
+    return _identity_map.set(IdentityMap())
+
+
+def deactivate(token):
+    _identity_map.reset(token)
+
+
+def get_user(pk=None, username=None):
+    """
+    Returns the user with `pk` or `username`, its profile joined in, loading it
+    at most once per request. Outside a request this is a plain query. Raises
+    User.DoesNotExist like User.objects.get().
+    """
+    identity_map = _identity_map.get()
+    if identity_map is not None:
+        user = identity_map.by_pk.get(pk) if pk is not None else identity_map.by_username.get(username)
+        if user is not None:
+            return user
+
+    lookup = {'pk': pk} if pk is not None else {'username': username}
+    user = User.objects.select_related('userprofile').get(**lookup)
+    return canonical(user)
+
+
+def canonical(user):
+    """
+    Returns the instance already loaded for `user` in this request, registering
+    `user` as that instance if it is the first.
+    """
+    identity_map = _identity_map.get()
+    if identity_map is None or user is None:
+        return user
+    return identity_map.add(user)
@@ -0,0 +1,146 @@
+import os
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.utils import timezone
+
+from . import models
+from . import queues
+from . import thumbnails
+
+BATCH_SIZE = 10
+MAX_ATTEMPTS = 5
+
+
+def staging():
+    """Local storage holding uploads until a worker has processed them."""
+    return FileSystemStorage(location=settings.IMAGE_STAGING_ROOT)
+
+
+def _asset_names(profile):
+    names = [name for files in profile.image_variants.values() for name in files.values()]
+    if profile.profile_image:
+        names.append(thumbnails.original_name(profile.profile_image))
+    return names
+
+
+def _deletion_delay():
+    # without a shared cache, other processes keep showing the replaced image
+    # until their cached headers and session users expire; its files must last as long
+    if settings.CACHE_IS_SHARED:
+        return timedelta(0)
+    return timedelta(seconds=max(settings.PROFILE_HEADER_CACHE_TIMEOUT, settings.SESSION_USER_CACHE_TIMEOUT))
+
+
+def _queue_deletion(profile, names):
+    return models.ImageJob.objects.create(
+        profile=profile, kind=models.ImageJob.DELETE, names=names,
+        next_attempt=timezone.now() + _deletion_delay(),
+    )
+
+
+def enqueue_upload(profile, file):
+    """
+    Stages an uploaded image and queues it for the process_image_jobs worker.
+    The profile keeps showing its current image until the worker switches it.
+    """
+    extension = os.path.splitext(file.name)[1].lower()
+    staged = staging().save(f'{profile.user_id}/{uuid.uuid4().hex}{extension}', file)
+    return models.ImageJob.objects.create(profile=profile, kind=models.ImageJob.UPLOAD, staged=staged)
+
+
+def remove(profile):
+    """Takes the profile's image down at once and queues its files for deletion."""
+    with transaction.atomic():
+        profile = models.UserProfile.objects.select_for_update().get(pk=profile.pk)
+        names = _asset_names(profile)
+        profile.profile_image = None
+        profile.image_variants = {}
+        profile.save(update_fields=['profile_image', 'image_variants'])
+        # queued even without files, so that an upload still pending doesn't bring an image back
+        _queue_deletion(profile, names)
+
+
+def _superseded(job):
+    return models.ImageJob.objects.filter(profile_id=job.profile_id, id__gt=job.id).exists()
+
+
+def _upload(job):
+    if job.profile_id is None or _superseded(job):
+        staging().delete(job.staged)
+        return
+
+    user_id = job.profile.user_id
+    with staging().open(job.staged) as file:
+        rendered = thumbnails.render(file)
+        file.seek(0)
+        extension = os.path.splitext(job.staged)[1]
+        original = thumbnails.storage().save(f'profile_images/{user_id}/{uuid.uuid4().hex[:12]}{extension}', file)
+    stored = [original]
+
+    try:
+        variants = thumbnails.store(user_id, rendered)
+        stored += [name for files in variants.values() for name in files.values()]
+
+        with transaction.atomic():
+            profile = models.UserProfile.objects.select_for_update().get(pk=job.profile_id)
+            if _superseded(job):
+                # a removal or newer upload got in while this one was being processed
+                unused = stored
+            else:
+                unused = _asset_names(profile)
+                profile.profile_image = original
+                profile.image_variants = variants
+                profile.save(update_fields=['profile_image', 'image_variants'])
+            if unused:
+                _queue_deletion(profile, unused)
+    except Exception:
+        # nothing refers to this attempt's files, so a retry must not find them still counted
+        for name in stored:
+            thumbnails.storage().delete(name)
+        raise
+
+    staging().delete(job.staged)
+
+
+def _delete(job):
+    names = list(job.names)
+    while names:
+        # each delete drops a shared file's reference, so a retried job must not repeat one
+        with transaction.atomic():
+            thumbnails.storage().delete(names.pop(0))
+            models.ImageJob.objects.filter(id=job.id).update(names=names)
+
+
+RUNNERS = {
+    models.ImageJob.UPLOAD: _upload,
+    models.ImageJob.DELETE: _delete,
+}
+
+
+def run_batch(batch_size=BATCH_SIZE):
+    """
+    Runs up to `batch_size` due jobs and returns (done, failed). Failed jobs
+    are retried with exponential backoff until MAX_ATTEMPTS, after which they
+    are left marked as failed along with their staged upload.
+    """
+    done = failed = 0
+    for job in queues.claim(models.ImageJob, batch_size):
+        try:
+            RUNNERS[job.kind](job)
+        except Exception as error:
+            _failed(job, error)
+            failed += 1
+        else:
+            models.ImageJob.objects.filter(id=job.id).update(
+                status=models.ImageJob.DONE, finished=timezone.now(), last_error='',
+            )
+            done += 1
+    return done, failed
+
+
+def _failed(job, error):
+    queues.retry_or_fail(job, error, MAX_ATTEMPTS)
@@ -0,0 +1,66 @@
+import contextlib
+import time
+from unittest import mock
+
+from django.contrib.auth import authenticate
+from django.contrib.auth import base_user
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from main import forms
+
+
+class Command(BaseCommand):
+    help = (
+        'Times logins through the login view against the previous flow, in '
+        'which the form and then authenticate() each checked the password, '
+        'posting both to the same view. '
+        'Runs against a throwaway test database with the configured password hasher.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=20)
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0)
+        try:
+            self._run(options['logins'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def _run(self, logins):
+        email, password = 'benchmark@example.com', 'benchmark-Passw0rd'
+        User.objects.create_user('benchmark', email, password)
+        data = {'email': email, 'password': password}
+
+        def previous_get_user(form):
+            # the view used to authenticate() the form's credentials, hashing the password again
+            return authenticate(email=form.cleaned_data['email'], password=form.cleaned_data['password'])
+
+        def post_login():
+            response = Client().post('/', data)
+            assert response.status_code == 302, response.status_code
+
+        flows = (
+            ('previous: form + authenticate()', mock.patch.object(forms.CustomAuthenticationForm, 'get_user', previous_get_user)),
+            ('login view', contextlib.nullcontext()),
+        )
+        checks = mock.patch.object(base_user, 'check_password', wraps=base_user.check_password)
+
+        # both go through the same POST to the login view, only get_user() differs
+        for name, flow in flows:
+            with flow, checks as check_password:
+                start = time.perf_counter()
+                for _ in range(logins):
+                    post_login()
+                elapsed = time.perf_counter() - start
+
+            self.stdout.write(
+                f'{name}: {elapsed / logins * 1000:.1f} ms per login, '
+                f'{check_password.call_count / logins:g} password hashes per login'
+            )
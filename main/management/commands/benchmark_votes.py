@@ -0,0 +1,135 @@
+import asyncio
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.http import JsonResponse
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from django.urls import include, path
+from django.utils.module_loading import import_string
+
+from main import models
+
+
+@login_required
+def sync_vote_view(request):
+    """vote_view as it was before it became async, to compare it with."""
+    review = models.Review.objects.only('id', 'to_user_id', *models.Review.COUNTER_FIELDS).get(id=request.POST['review_id'])
+    if request.POST['action'] == 'upvote':
+        has_upvoted, has_downvoted = review.upvote(request.user)
+    else:
+        has_upvoted, has_downvoted = review.downvote(request.user)
+
+    return JsonResponse({
+        'success': True,
+        'review_id': review.id,
+        'upvotes_count': review.upvotes_count,
+        'downvotes_count': review.downvotes_count,
+        'has_upvoted': has_upvoted,
+        'has_downvoted': has_downvoted,
+    })
+
+
+# the app's URLs with the sync view mounted next to the async one
+urlpatterns = [
+    path('sync-vote/', sync_vote_view),
+    path('', include('ReviewsElicitation.urls')),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Fires bursts of vote clicks at the previous sync vote view through the '
+        'WSGI handler and at the async vote view through the ASGI handler, both '
+        'behind the configured MIDDLEWARE, and compares their throughput. Runs '
+        'against a throwaway test database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--voters', type=int, default=20)
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        if connection.vendor == 'sqlite':
+            # an in-memory test database can't take writes from several threads
+            connection.settings_dict['TEST']['NAME'] = os.path.join(tempfile.mkdtemp(), 'benchmark.sqlite3')
+        sync_only = [name for name in settings.MIDDLEWARE if not getattr(import_string(name), 'async_capable', False)]
+        if sync_only:
+            self.stderr.write(self.style.WARNING(
+                f'Sync-only middleware puts the async view behind a worker thread under ASGI: {", ".join(sync_only)}'
+            ))
+
+        old_name = connection.creation.create_test_db(verbosity=0)
+        try:
+            with override_settings(ROOT_URLCONF=__name__):
+                clients, review_id = self._setup(options['voters'])
+                total, concurrency = options['requests'], options['concurrency']
+
+                wsgi = self._run_wsgi(clients, review_id, total, concurrency)
+                asgi = asyncio.run(self._run_asgi(clients, review_id, total, concurrency))
+
+            for name, elapsed in (('sync view, WSGI (threads)', wsgi), ('async view, ASGI (asyncio)', asgi)):
+                self.stdout.write(f'{name}: {total} votes in {elapsed:.2f}s, {total / elapsed:.0f} req/s')
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def _setup(self, voters):
+        receiver = User.objects.create_user('benchmark-receiver', 'receiver@example.com', 'unused')
+        giver = User.objects.create_user('benchmark-giver', 'giver@example.com', 'unused')
+        review = models.Review.objects.create(to_user=receiver, from_user=giver)
+
+        sessions = []
+        for index in range(voters):
+            user = User.objects.create_user(f'benchmark-voter-{index}', f'voter{index}@example.com', 'unused')
+            client = Client()
+            client.force_login(user, backend='django.contrib.auth.backends.ModelBackend')
+            sessions.append(client.cookies)
+
+        return sessions, review.id
+
+    def _payload(self, review_id, index):
+        return {'review_id': review_id, 'action': 'upvote' if index % 2 else 'downvote'}
+
+    def _run_wsgi(self, sessions, review_id, total, concurrency):
+        clients = []
+        for cookies in sessions:
+            client = Client()
+            client.cookies = cookies
+            clients.append(client)
+
+        def click(index):
+            response = clients[index % len(clients)].post('/sync-vote/', self._payload(review_id, index))
+            assert response.status_code == 200, response.status_code
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as executor:
+            list(executor.map(click, range(total)))
+        return time.perf_counter() - start
+
+    async def _run_asgi(self, sessions, review_id, total, concurrency):
+        clients = []
+        for cookies in sessions:
+            client = AsyncClient()
+            client.cookies = cookies
+            clients.append(client)
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def click(index):
+            async with semaphore:
+                response = await clients[index % len(clients)].post('/vote/', self._payload(review_id, index))
+                assert response.status_code == 200, response.status_code
+
+        start = time.perf_counter()
+        await asyncio.gather(*(click(index) for index in range(total)))
+        return time.perf_counter() - start
@@ -0,0 +1,32 @@
+import os
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from main import assets
+
+
+class Command(BaseCommand):
+    help = (
+        'Collects the static files, minifying, fingerprinting and precompressing '
+        "this app's stylesheets and scripts, and reports their sizes."
+    )
+
+    def handle(self, *args, **options):
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+        if not hasattr(staticfiles_storage, 'hashed_files'):
+            self.stdout.write(f'Collected with {settings.STATICFILES_STORAGE}, which does not fingerprint files.')
+            return
+
+        for name, hashed in sorted(staticfiles_storage.hashed_files.items()):
+            if not name.startswith(assets.MinifiedManifestStaticFilesStorage.minify_prefixes):
+                continue
+
+            sizes = []
+            for path in (finders.find(name), *(staticfiles_storage.path(hashed + suffix) for suffix in ('', '.gz', '.br'))):
+                sizes.append(f'{os.path.getsize(path):>7}' if path and os.path.exists(path) else '      -')
+            self.stdout.write(f'{hashed:<40} source {sizes[0]}  minified {sizes[1]}  gzip {sizes[2]}  brotli {sizes[3]}')
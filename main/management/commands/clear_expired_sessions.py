@@ -0,0 +1,27 @@
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        'Deletes expired sessions from the session store configured by SESSION_MODE. '
+        'With --loop it keeps doing so, for running as a scheduler next to the app.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep running, clearing every interval.')
+        parser.add_argument('--interval', type=float, default=60 * 60, help='Seconds between runs (with --loop).')
+
+    def handle(self, *args, **options):
+        engine = import_module(settings.SESSION_ENGINE)
+
+        while True:
+            # a no-op for the cache and signed_cookies modes, whose sessions expire by themselves
+            engine.SessionStore.clear_expired()
+            self.stdout.write(f'Cleared expired {settings.SESSION_MODE} sessions.')
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
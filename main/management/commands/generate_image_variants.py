@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from main import models
+from main import thumbnails
+
+
+class Command(BaseCommand):
+    help = 'Generates the resized variants of profile images uploaded before they existed, or of all of them with --all.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Regenerate the variants of every profile image.')
+
+    def handle(self, *args, **options):
+        profiles = models.UserProfile.objects.exclude(profile_image='').exclude(profile_image=None)
+        if not options['all']:
+            profiles = profiles.filter(image_variants={})
+
+        done = failed = 0
+        for profile in profiles.iterator():
+            try:
+                thumbnails.generate(profile)
+            except Exception as error:
+                failed += 1
+                self.stderr.write(f'{profile}: {error}')
+            else:
+                done += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Generated variants for {done} profile images, {failed} failed.'))
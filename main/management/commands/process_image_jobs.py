@@ -0,0 +1,21 @@
+from django.conf import settings
+
+from main import image_jobs
+from main.management.queue_worker import QueueWorkerCommand
+
+
+class Command(QueueWorkerCommand):
+    help = 'Processes queued profile image uploads and deletions. Several workers can run side by side.'
+    batch_size = image_jobs.BATCH_SIZE
+    interval = 2
+
+    def handle(self, *args, **options):
+        if not settings.CACHE_IS_SHARED:
+            self.stderr.write(self.style.WARNING(
+                'CACHE_BACKEND is per-process: web workers keep showing a replaced image until their '
+                'cached profile headers and session users expire. Use a shared cache to switch at once.'
+            ))
+        super().handle(*args, **options)
+
+    def run_batch(self, batch_size):
+        return image_jobs.run_batch(batch_size)
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from main import profile_headers
+
+
+class Command(BaseCommand):
+    help = 'Shows the hit/miss counters of the profile header cache.'
+
+    def handle(self, *args, **options):
+        stats = profile_headers.stats()
+        lookups = stats['hits'] + stats['misses']
+        ratio = stats['hits'] / lookups if lookups else 0
+        self.stdout.write(f"hits: {stats['hits']}, misses: {stats['misses']}, hit ratio: {ratio:.1%}")
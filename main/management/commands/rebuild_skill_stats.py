@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from main import skill_stats
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the per-user skill rating statistics from all reviews.'
+
+    def handle(self, *args, **options):
+        count = skill_stats.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt skill stats for {count} users.'))
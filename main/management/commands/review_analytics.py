@@ -0,0 +1,191 @@
+import csv
+import os
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from main import models
+
+CRITERIA = [criterion for criterion, _ in models.Review.RATING_FIELDS]
+RATING_FIELDS = [field for _, field in models.Review.RATING_FIELDS]
+
+
+class RatingAccumulator:
+    """
+    Running totals over chunks of reviews, so memory grows with the number of
+    reviewed users rather than the number of reviews.
+
+    Ratings outside 1-5, such as the 0 of "not rated", are left out of every
+    statistic and counted as unrated. A review's vote weight is
+    (1 + upvotes) / (1 + upvotes + downvotes): 1 for a review nobody
+    downvoted, tending to 0 as downvotes dominate.
+    """
+
+    def __init__(self):
+        criteria = len(CRITERIA)
+        self.histograms = np.zeros((criteria, 6), dtype=np.int64)
+
+        # per user, in the order of the sorted user_ids seen so far
+        self.user_ids = np.zeros(0, dtype=np.int64)
+        self.reviews = np.zeros(0, dtype=np.int64)
+        self.rated = np.zeros((criteria, 0), dtype=np.int64)
+        self.sums = np.zeros((criteria, 0))
+        self.weights = np.zeros((criteria, 0))
+        self.weighted_sums = np.zeros((criteria, 0))
+
+        # for the correlations, over reviews rated on every criterion
+        self.complete = 0
+        self.totals = np.zeros(criteria)
+        self.products = np.zeros((criteria, criteria))
+
+    def _index(self, users):
+        """Adds the new ids among `users` to user_ids and returns each one's position there."""
+        chunk_ids, inverse = np.unique(users, return_inverse=True)
+        user_ids = np.union1d(self.user_ids, chunk_ids)
+        if len(user_ids) > len(self.user_ids):
+            # move the totals so far to their users' new positions
+            positions = np.searchsorted(user_ids, self.user_ids)
+            for name in ('reviews', 'rated', 'sums', 'weights', 'weighted_sums'):
+                old = getattr(self, name)
+                new = np.zeros(old.shape[:-1] + (len(user_ids),), dtype=old.dtype)
+                new[..., positions] = old
+                setattr(self, name, new)
+            self.user_ids = user_ids
+        return np.searchsorted(user_ids, chunk_ids)[inverse]
+
+    def add(self, chunk):
+        """Folds in a (rows, 3 + criteria) array of user id, upvotes, downvotes, ratings."""
+        users = self._index(chunk[:, 0])
+        upvotes = chunk[:, 1].astype(float)
+        downvotes = chunk[:, 2].astype(float)
+        ratings = chunk[:, 3:].T
+
+        length = len(self.user_ids)
+        self.reviews += np.bincount(users, minlength=length)
+
+        vote_weight = (1 + upvotes) / (1 + upvotes + downvotes)
+        rated = (ratings >= 1) & (ratings <= 5)
+
+        for index in range(len(CRITERIA)):
+            self.histograms[index] += np.bincount(np.where(rated[index], ratings[index], 0), minlength=6)
+
+            mask = rated[index]
+            positions = users[mask]
+            values = ratings[index][mask].astype(float)
+            weights = vote_weight[mask]
+            self.rated[index] += np.bincount(positions, minlength=length)
+            self.sums[index] += np.bincount(positions, weights=values, minlength=length)
+            self.weights[index] += np.bincount(positions, weights=weights, minlength=length)
+            self.weighted_sums[index] += np.bincount(positions, weights=weights * values, minlength=length)
+
+        complete = ratings[:, rated.all(axis=0)].T.astype(float)
+        self.complete += complete.shape[0]
+        self.totals += complete.sum(axis=0)
+        self.products += complete.T @ complete
+
+    def means(self):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return self.sums / self.rated
+
+    def weighted_means(self):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return self.weighted_sums / self.weights
+
+    def correlations(self):
+        if self.complete < 2:
+            return np.full((len(CRITERIA), len(CRITERIA)), np.nan)
+        mean = self.totals / self.complete
+        covariance = self.products / self.complete - np.outer(mean, mean)
+        deviation = np.sqrt(np.diag(covariance))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return covariance / np.outer(deviation, deviation)
+
+
+class Command(BaseCommand):
+    help = (
+        'Computes rating histograms, per-user means, vote-weighted scores and '
+        'cross-criterion correlations over all reviews and writes them as CSV '
+        'files plus a columnar .npz archive.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default='review_analytics', help='Directory to write the results to.')
+        parser.add_argument('--chunk-size', type=int, default=50000, help='Reviews read from the database at a time.')
+
+    def handle(self, *args, **options):
+        output = options['output']
+        chunk_size = options['chunk_size']
+        os.makedirs(output, exist_ok=True)
+
+        accumulator = RatingAccumulator()
+        rows = (
+            models.Review.objects.order_by()
+            .values_list('to_user_id', 'upvotes_count', 'downvotes_count', *RATING_FIELDS)
+            .iterator(chunk_size=chunk_size)
+        )
+
+        total = 0
+        buffer = []
+        for row in rows:
+            buffer.append(row)
+            if len(buffer) == chunk_size:
+                accumulator.add(np.array(buffer, dtype=np.int64))
+                total += len(buffer)
+                buffer = []
+        if buffer:
+            accumulator.add(np.array(buffer, dtype=np.int64))
+            total += len(buffer)
+
+        user_ids = accumulator.user_ids
+        means = accumulator.means()
+        weighted_means = accumulator.weighted_means()
+        correlations = accumulator.correlations()
+
+        self._write_histograms(output, accumulator.histograms)
+        self._write_users(output, accumulator, user_ids, means, weighted_means)
+        self._write_correlations(output, correlations)
+
+        columns = {
+            'user_id': user_ids,
+            'reviews': accumulator.reviews,
+            'histograms': accumulator.histograms,
+            'correlations': correlations,
+        }
+        for index, criterion in enumerate(CRITERIA):
+            columns[f'{criterion}_ratings'] = accumulator.rated[index]
+            columns[f'{criterion}_mean'] = means[index]
+            columns[f'{criterion}_weighted'] = weighted_means[index]
+        np.savez_compressed(os.path.join(output, 'review_analytics.npz'), **columns)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Analysed {total} reviews of {len(user_ids)} users into {output}/.'
+        ))
+
+    def _write_histograms(self, output, histograms):
+        with open(os.path.join(output, 'histograms.csv'), 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['criterion', 'rating', 'count'])
+            for index, criterion in enumerate(CRITERIA):
+                for rating in range(1, 6):
+                    writer.writerow([criterion, rating, int(histograms[index, rating])])
+                writer.writerow([criterion, 'unrated', int(histograms[index, 0])])
+
+    def _write_users(self, output, accumulator, user_ids, means, weighted_means):
+        header = ['user_id', 'reviews']
+        columns = [user_ids, accumulator.reviews]
+        for index, criterion in enumerate(CRITERIA):
+            header += [f'{criterion}_ratings', f'{criterion}_mean', f'{criterion}_weighted']
+            columns += [accumulator.rated[index], means[index], weighted_means[index]]
+
+        formats = ['%d', '%d'] + ['%d', '%.4f', '%.4f'] * len(CRITERIA)
+        np.savetxt(
+            os.path.join(output, 'user_stats.csv'), np.column_stack(columns) if len(user_ids) else np.empty((0, len(header))),
+            fmt=formats, delimiter=',', header=','.join(header), comments='',
+        )
+
+    def _write_correlations(self, output, correlations):
+        with open(os.path.join(output, 'correlations.csv'), 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['criterion'] + CRITERIA)
+            for index, criterion in enumerate(CRITERIA):
+                writer.writerow([criterion] + [f'{value:.4f}' for value in correlations[index]])
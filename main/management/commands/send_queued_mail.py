@@ -0,0 +1,11 @@
+from main import outbox
+from main.management.queue_worker import QueueWorkerCommand
+
+
+class Command(QueueWorkerCommand):
+    help = 'Sends the emails queued in the outbox, in batches over one mail server connection each.'
+    batch_size = outbox.BATCH_SIZE
+    done_label = 'sent'
+
+    def run_batch(self, batch_size):
+        return outbox.send_batch(batch_size)
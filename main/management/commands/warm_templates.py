@@ -0,0 +1,27 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.template import engines
+
+from main import warmup
+
+
+class Command(BaseCommand):
+    help = (
+        'Compiles every template of the app, as gunicorn workers do at boot, and '
+        'reports how long that takes and what loading them costs afterwards.'
+    )
+
+    def handle(self, *args, **options):
+        count, compile_time = warmup.warm_templates()
+        self.stdout.write(f'Compiled {count} templates in {compile_time * 1000:.1f} ms.')
+
+        engine = engines['django']
+        start = time.perf_counter()
+        for name in warmup.template_names():
+            engine.get_template(name)
+        load_time = time.perf_counter() - start
+
+        cached = 'from the cached loader' if settings.TEMPLATE_CACHE else 'without TEMPLATE_CACHE, so re-read and recompiled'
+        self.stdout.write(f'Loading them again took {load_time * 1000:.1f} ms ({cached}).')
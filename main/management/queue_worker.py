@@ -0,0 +1,43 @@
+import time
+from abc import ABC, abstractmethod
+
+from django.core.management.base import BaseCommand
+
+
+class QueueWorkerCommand(BaseCommand, ABC):
+    """
+    Drains a database-backed queue (see main/queues.py) in batches, once or,
+    with --loop, until stopped. Subclasses set the defaults below and
+    implement run_batch().
+    """
+    batch_size = 10
+    # seconds to wait when the queue is empty (with --loop)
+    interval = 5
+    # what a settled item counts as, e.g. 'sent'
+    done_label = 'done'
+
+    @abstractmethod
+    def run_batch(self, batch_size):
+        """Processes up to `batch_size` due items and returns (done, failed)."""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=self.batch_size)
+        parser.add_argument('--loop', action='store_true', help='Keep running, polling for new items.')
+        parser.add_argument('--interval', type=float, default=self.interval, help='Seconds to wait when there is nothing to do (with --loop).')
+
+    def handle(self, *args, **options):
+        total_done = total_failed = 0
+
+        while True:
+            done, failed = self.run_batch(options['batch_size'])
+            total_done += done
+            total_failed += failed
+
+            if done or failed:
+                self.stdout.write(f'{self.done_label.capitalize()} {done}, failed {failed}.')
+            elif options['loop']:
+                time.sleep(options['interval'])
+            else:
+                break
+
+        self.stdout.write(self.style.SUCCESS(f'Finished: {self.done_label} {total_done}, failed {total_failed}.'))
@@ -1,5 +1,14 @@
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
 from django.shortcuts import redirect
 from django.urls import reverse
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from . import identity
+
+logger = logging.getLogger(__name__)
 
 class AuthenticationMiddleware:
     def __init__(self, get_response):
@@ -11,3 +20,108 @@ class AuthenticationMiddleware:
         
         response = self.get_response(request)
         return response
+
+
+class IdentityMapMiddleware:
+    """Gives each request its own identity map of users (see main.identity)."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        token = identity.activate()
+        try:
+            return self.get_response(request)
+        finally:
+            identity.deactivate(token)
+
+    async def __acall__(self, request):
+        token = identity.activate()
+        try:
+            return await self.get_response(request)
+        finally:
+            identity.deactivate(token)
+
+
+class FirstRequestTimingMiddleware:
+    """
+    Logs how long the process took over its first request, which pays for
+    whatever the warmup left to load lazily. Outermost, so that the time
+    includes the other middleware.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.first_request = True
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not self.first_request:
+            return self.get_response(request)
+
+        self.first_request = False
+        start = time.perf_counter()
+        try:
+            return self.get_response(request)
+        finally:
+            self._log(request, start)
+
+    async def __acall__(self, request):
+        if not self.first_request:
+            return await self.get_response(request)
+
+        self.first_request = False
+        start = time.perf_counter()
+        try:
+            return await self.get_response(request)
+        finally:
+            self._log(request, start)
+
+    def _log(self, request, start):
+        elapsed = time.perf_counter() - start
+        logger.info('Served the first request (%s %s) in %.1f ms.', request.method, request.path, elapsed * 1000)
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise, able to run under ASGI as well. WhiteNoise's own middleware
+    is sync only, which makes Django run everything after it, async views
+    included, through a worker thread. Static files are still served by
+    WhiteNoise's sync code, in a thread of their own.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, **kwargs):
+        super().__init__(get_response, **kwargs)
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file, thread_sensitive=False)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve, thread_sensitive=False)(static_file, request)
+        return await self.get_response(request)
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.2 on 2026-10-16 22:57
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_vote_counters(apps, schema_editor):
+    Review = apps.get_model('main', 'Review')
+
+    def vote_count(through):
+        counts = through.objects.filter(review=OuterRef('pk')).order_by().values('review').annotate(total=Count('*')).values('total')
+        return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+    Review.objects.update(
+        upvotes_count=vote_count(Review.upvotes.through),
+        downvotes_count=vote_count(Review.downvotes.through),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0014_alter_userprofile_profile_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='review',
+            name='downvotes_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='upvotes_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_vote_counters, migrations.RunPython.noop),
+    ]
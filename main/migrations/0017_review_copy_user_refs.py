@@ -0,0 +1,64 @@
+import logging
+
+from django.db import migrations
+
+logger = logging.getLogger(__name__)
+
+
+def copy_user_refs(apps, schema_editor):
+    Review = apps.get_model('main', 'Review')
+    User = apps.get_model('auth', 'User')
+
+    user_ids = dict(User.objects.values_list('username', 'id'))
+
+    reviews = []
+    orphans = []
+    missing_usernames = set()
+    for review in Review.objects.only('id', 'to_user', 'from_user', 'anonymous_from', 'is_anonymous').iterator(chunk_size=2000):
+        review.to_user_ref_id = user_ids.get(review.to_user)
+        review.from_user_ref_id = user_ids.get(review.from_user)
+        review.is_anonymous = review.anonymous_from == 'Anonymous'
+
+        # reviews left behind by deleted accounts can't be pointed at anyone
+        if review.to_user_ref_id is None or review.from_user_ref_id is None:
+            orphans.append(review.id)
+            missing_usernames.update(
+                username for username in (review.to_user, review.from_user) if username not in user_ids
+            )
+        else:
+            reviews.append(review)
+
+    if orphans:
+        logger.warning(
+            'Deleting %d reviews given by or to users that no longer exist: %s',
+            len(orphans), ', '.join(sorted(missing_usernames)),
+        )
+        Review.objects.filter(id__in=orphans).delete()
+    Review.objects.bulk_update(reviews, ['to_user_ref', 'from_user_ref', 'is_anonymous'], batch_size=2000)
+
+
+def copy_usernames(apps, schema_editor):
+    Review = apps.get_model('main', 'Review')
+    User = apps.get_model('auth', 'User')
+
+    usernames = dict(User.objects.values_list('id', 'username'))
+
+    reviews = []
+    for review in Review.objects.only('id', 'to_user_ref', 'from_user_ref', 'is_anonymous').iterator(chunk_size=2000):
+        review.to_user = usernames[review.to_user_ref_id]
+        review.from_user = usernames[review.from_user_ref_id]
+        review.anonymous_from = 'Anonymous' if review.is_anonymous else review.from_user
+        reviews.append(review)
+
+    Review.objects.bulk_update(reviews, ['to_user', 'from_user', 'anonymous_from'], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0016_review_user_refs'),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_user_refs, copy_usernames),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 4.2.2 on 2026-10-16 23:20
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('main', '0017_review_copy_user_refs'),
+    ]
+
+    operations = [
+        # a default lets the column be re-added when unapplying
+        migrations.AlterField(
+            model_name='review',
+            name='to_user',
+            field=models.CharField(default='', max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='review',
+            name='from_user',
+            field=models.CharField(default='', max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='review',
+            name='anonymous_from',
+            field=models.CharField(default='', max_length=100),
+        ),
+        migrations.RemoveField(
+            model_name='review',
+            name='to_user',
+        ),
+        migrations.RemoveField(
+            model_name='review',
+            name='from_user',
+        ),
+        migrations.RemoveField(
+            model_name='review',
+            name='anonymous_from',
+        ),
+        migrations.RenameField(
+            model_name='review',
+            old_name='to_user_ref',
+            new_name='to_user',
+        ),
+        migrations.RenameField(
+            model_name='review',
+            old_name='from_user_ref',
+            new_name='from_user',
+        ),
+        migrations.AlterField(
+            model_name='review',
+            name='to_user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='received_reviews', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='review',
+            name='from_user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='given_reviews', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterUniqueTogether(
+            name='review',
+            unique_together={('to_user', 'from_user')},
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['to_user', 'created'], name='main_review_to_user_created'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['from_user', 'created'], name='main_review_from_user_created'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+import logging
+
+from django.conf import settings
+from django.db import DatabaseError, migrations, transaction
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'main_usersearch'
+TRIGRAM_INDEX = 'main_auth_user_name_trgm'
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+
+    # without the extension/FTS5 the app falls back to plain ORM search, slower
+    # but working, so a database that can't have the index still migrates
+    try:
+        with transaction.atomic(using=schema_editor.connection.alias):
+            if vendor == 'postgresql':
+                schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+                schema_editor.execute(
+                    f"CREATE INDEX IF NOT EXISTS {TRIGRAM_INDEX} ON auth_user "
+                    f"USING gin ((lower(first_name || ' ' || last_name)) gin_trgm_ops)"
+                )
+            elif vendor == 'sqlite':
+                schema_editor.execute(
+                    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+                    f"first_name, last_name, prefix='1 2 3', tokenize='unicode61 remove_diacritics 2')"
+                )
+                schema_editor.execute(
+                    f'INSERT INTO {FTS_TABLE} (rowid, first_name, last_name) '
+                    f'SELECT id, first_name, last_name FROM auth_user'
+                )
+    except DatabaseError as error:
+        logger.warning(
+            'Could not create the user search index (%s), so user search falls back to '
+            'unindexed name matching. Migrate main back to 0018 and forward again once the database supports it.',
+            error,
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+
+    if vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX IF EXISTS {TRIGRAM_INDEX}')
+    elif vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('main', '0018_review_user_foreign_keys'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
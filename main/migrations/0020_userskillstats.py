@@ -0,0 +1,66 @@
+# Generated by Django 4.2.2 on 2026-10-16 23:04
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Q, Sum
+import main.models
+
+RATING_FIELDS = (
+    ('problem_solving', 'review_rating_1'),
+    ('communication', 'review_rating_2'),
+    ('sociability', 'review_rating_3'),
+)
+
+
+def backfill_skill_stats(apps, schema_editor):
+    Review = apps.get_model('main', 'Review')
+    UserSkillStats = apps.get_model('main', 'UserSkillStats')
+
+    annotations = {
+        'review_count': Count('id'),
+        'upvotes_total': Sum('upvotes_count'),
+        'downvotes_total': Sum('downvotes_count'),
+    }
+    for criterion, field in RATING_FIELDS:
+        annotations[f'{criterion}_sum'] = Sum(field, filter=Q(**{f'{field}__range': (1, 5)}), default=0)
+        for rating in range(1, 6):
+            annotations[f'{criterion}_{rating}'] = Count('id', filter=Q(**{field: rating}))
+
+    stats = []
+    for row in Review.objects.order_by().values('to_user').annotate(**annotations):
+        fields = {key: row[key] for key in ('review_count', 'upvotes_total', 'downvotes_total')}
+        for criterion, _ in RATING_FIELDS:
+            fields[f'{criterion}_sum'] = row[f'{criterion}_sum']
+            fields[f'{criterion}_histogram'] = [row[f'{criterion}_{rating}'] for rating in range(1, 6)]
+        stats.append(UserSkillStats(user_id=row['to_user'], **fields))
+
+    UserSkillStats.objects.bulk_create(stats, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('main', '0019_user_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserSkillStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('review_count', models.PositiveIntegerField(default=0)),
+                ('problem_solving_sum', models.PositiveIntegerField(default=0)),
+                ('problem_solving_histogram', models.JSONField(default=main.models.empty_histogram)),
+                ('communication_sum', models.PositiveIntegerField(default=0)),
+                ('communication_histogram', models.JSONField(default=main.models.empty_histogram)),
+                ('sociability_sum', models.PositiveIntegerField(default=0)),
+                ('sociability_histogram', models.JSONField(default=main.models.empty_histogram)),
+                ('upvotes_total', models.IntegerField(default=0)),
+                ('downvotes_total', models.IntegerField(default=0)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='skill_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(backfill_skill_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.db import migrations
+
+EMAIL_INDEX = 'main_auth_user_email'
+
+
+def create_email_index(apps, schema_editor):
+    schema_editor.execute(f'CREATE INDEX {EMAIL_INDEX} ON auth_user (email)')
+
+
+def drop_email_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute(f'DROP INDEX {EMAIL_INDEX} ON auth_user')
+    else:
+        schema_editor.execute(f'DROP INDEX {EMAIL_INDEX}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('main', '0022_outboundemail'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_email_index, drop_email_index),
+    ]
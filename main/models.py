@@ -1,5 +1,7 @@
-from django.db import models
+from django.db import IntegrityError, connection, models, transaction
+from django.db.models import F
 from django.contrib.auth.models import User
+from django.utils import timezone
 from django.conf import settings
 
 class UserProfile(models.Model):
@@ -13,13 +15,16 @@ class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     
     if settings.DEBUG:
-        profile_image = models.ImageField(upload_to='profile_images', blank=True, null=True)
+        from . import thumbnails
+        profile_image = models.ImageField(upload_to='profile_images', storage=thumbnails.storage, blank=True, null=True)
     
     ### deployment changes in media file field ###
     else:
         from cloudinary.models import CloudinaryField
         profile_image = CloudinaryField('image', blank=True, null=True)
     ### end of deployment changes ###
+    # storage names of the resized copies of profile_image, see main/thumbnails.py
+    image_variants = models.JSONField(default=dict, blank=True)
 
     contact_number = models.CharField(max_length=10)
     bio = models.TextField(blank=True, null=True)
@@ -30,8 +35,10 @@ class UserProfile(models.Model):
 
 
 class Review(models.Model):
-    to_user = models.CharField(max_length=100)
-    from_user = models.CharField(max_length=100)
+    # both keys lead a composite index below, so they don't get one of their own
+    to_user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='received_reviews', db_index=False)
+    from_user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='given_reviews', db_index=False)
+    created = models.DateTimeField(default=timezone.now)
 
     review_rating_1 = models.IntegerField(default=0)
     review_rating_2 = models.IntegerField(default=0)
@@ -46,53 +53,315 @@ class Review(models.Model):
     sociability_bool = models.BooleanField(default=False)
 
     is_anonymous = models.BooleanField(default=False)
-    anonymous_from = models.CharField(max_length=100)
 
     upvotes = models.ManyToManyField(User, related_name='upvoted_reviews', blank=True)
     downvotes = models.ManyToManyField(User, related_name='downvoted_reviews', blank=True)
 
+    # denormalized sizes of `upvotes`/`downvotes`, only ever changed through F() updates
+    upvotes_count = models.PositiveIntegerField(default=0)
+    downvotes_count = models.PositiveIntegerField(default=0)
+
+    # bumped whenever the review's content or visibility changes
+    version = models.PositiveIntegerField(default=0)
+
+    COUNTER_FIELDS = ('upvotes_count', 'downvotes_count')
+
+    # the review_criteria table each rating field is scored against
+    RATING_FIELDS = (
+        ('problem_solving', 'review_rating_1'),
+        ('communication', 'review_rating_2'),
+        ('sociability', 'review_rating_3'),
+    )
+
+    # the public/private flag of each review text, by skill
+    VISIBILITY_FIELDS = {
+        'problem_solving': 'problem_solving_bool',
+        'communication': 'communication_bool',
+        'sociability': 'sociability_bool',
+    }
+
     class Meta:
         unique_together = ('to_user', 'from_user')
+        indexes = [
+            models.Index(fields=['to_user', 'created'], name='main_review_to_user_created'),
+            models.Index(fields=['from_user', 'created'], name='main_review_from_user_created'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            return super().save(*args, **kwargs)
+
+        # updates never write back the (possibly stale) vote counters, and any
+        # change bumps the version the cached card fragments are keyed on
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            update_fields = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in (*self.COUNTER_FIELDS, 'version')
+            ]
+        update_fields = [name for name in update_fields if name != 'version']
+        if not update_fields:
+            return
+
+        kwargs['update_fields'] = [*update_fields, 'version']
+        self.version = F('version') + 1
+        super().save(*args, **kwargs)
+        # deferred, so the new value is only read back if something asks for it
+        del self.version
+
+    def _toggle_vote(self, user, name, opposite):
+        """
+        Toggles `user`'s vote in the `name` relation, withdrawing any vote in the
+        `opposite` one. The deletes double as the existence checks, so the
+        counters only move by rows that were actually added or removed. A
+        concurrent click that adds the same vote first wins; this one then
+        leaves the vote and the counters as they are.
+        """
+        votes = getattr(Review, name).through
+        opposite_votes = getattr(Review, opposite).through
+        deltas = {}
+
+        with transaction.atomic():
+            removed, _ = votes.objects.filter(review=self, user=user).delete()
+            if removed:
+                deltas[name] = -1
+            else:
+                try:
+                    with transaction.atomic():
+                        votes.objects.create(review=self, user=user)
+                except IntegrityError:
+                    # already added by the other click, which also withdrew the opposite vote
+                    return True
+                deltas[name] = 1
+                withdrawn, _ = opposite_votes.objects.filter(review=self, user=user).delete()
+                if withdrawn:
+                    deltas[opposite] = -1
+
+            Review.objects.filter(pk=self.pk).update(**{
+                f'{field}_count': F(f'{field}_count') + delta for field, delta in deltas.items()
+            })
+            UserSkillStats.objects.filter(user_id=self.to_user_id).update(**{
+                f'{field}_total': F(f'{field}_total') + delta for field, delta in deltas.items()
+            })
+
+        for field, delta in deltas.items():
+            setattr(self, f'{field}_count', getattr(self, f'{field}_count') + delta)
+
+        return deltas[name] > 0
 
     def upvote(self, user):
-        if user not in self.upvotes.all():
-            self.upvotes.add(user)
-            if user in self.downvotes.all():
-                self.downvotes.remove(user)
-        elif user in self.upvotes.all():
-            self.upvotes.remove(user)
+        has_upvoted = self._toggle_vote(user, 'upvotes', 'downvotes')
+        return has_upvoted, False
 
     def downvote(self, user):
-        if user not in self.downvotes.all():
-            self.downvotes.add(user)
-            if user in self.upvotes.all():
-                self.upvotes.remove(user)
+        has_downvoted = self._toggle_vote(user, 'downvotes', 'upvotes')
+        return False, has_downvoted
+
+    @classmethod
+    def toggle_visibility(cls, owner, review_ids, skills):
+        """
+        Flips the public flags of `skills` on those of `review_ids` that
+        `owner` received and bumps their versions, in a single UPDATE so that
+        concurrent toggles can't overwrite each other. Returns the new flags
+        as {review id: {skill: value}}.
+        """
+        qn = connection.ops.quote_name
+        fields = [cls.VISIBILITY_FIELDS[skill] for skill in skills]
+        assignments = ', '.join(f'{qn(field)} = NOT {qn(field)}' for field in fields)
+        columns = ', '.join(qn(column) for column in ['id', *fields])
+        where = f'{qn("id")} IN ({", ".join(["%s"] * len(review_ids))}) AND {qn("to_user_id")} = %s'
+        params = [*review_ids, owner.pk]
+        update = f'UPDATE {qn(cls._meta.db_table)} SET {assignments}, {qn("version")} = {qn("version")} + 1 WHERE {where}'
+
+        with connection.cursor() as cursor:
+            if connection.vendor in ('postgresql', 'sqlite') and connection.features.can_return_columns_from_insert:
+                cursor.execute(f'{update} RETURNING {columns}', params)
+                rows = cursor.fetchall()
+            else:
+                with transaction.atomic():
+                    cursor.execute(update, params)
+                    cursor.execute(f'SELECT {columns} FROM {qn(cls._meta.db_table)} WHERE {where}', params)
+                    rows = cursor.fetchall()
 
-        elif user in self.downvotes.all():
-            self.downvotes.remove(user)
+        return {row[0]: {skill: bool(value) for skill, value in zip(skills, row[1:])} for row in rows}
+
+    def ratings(self):
+        return tuple(getattr(self, field) for _, field in self.RATING_FIELDS)
 
     def get_upvotes_count(self):
-        return self.upvotes.count()
+        return self.upvotes_count
 
     def get_downvotes_count(self):
-        return self.downvotes.count()
+        return self.downvotes_count
     
     def review_giver(self):
-        if self.anonymous_from == 'Anonymous':
+        if self.is_anonymous:
             return f'Anonymous'
         else:
-            FromUser = User.objects.get(username=self.from_user)
-            return f'{FromUser.first_name} {FromUser.last_name}'
+            return f'{self.from_user.first_name} {self.from_user.last_name}'
         
     def review_receiver(self):
-        ToUser = User.objects.get(username=self.to_user)
-        return f'{ToUser.first_name} {ToUser.last_name}'
+        return f'{self.to_user.first_name} {self.to_user.last_name}'
     
     def has_upvoted(self, user):
-        return user in self.upvotes.all()
+        return self.upvotes.filter(pk=user.pk).exists()
     
     def has_downvoted(self, user):
-        return user in self.downvotes.all()
+        return self.downvotes.filter(pk=user.pk).exists()
 
     def __str__(self):
         return f'{self.from_user} => {self.to_user}'
+
+
+
+def empty_histogram():
+    return [0, 0, 0, 0, 0]
+
+
+class UserSkillStats(models.Model):
+    """
+    Running totals of the reviews a user has received, kept up to date as
+    reviews are written, edited, deleted and voted on.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='skill_stats')
+    review_count = models.PositiveIntegerField(default=0)
+
+    # per criterion: the sum of its 1-5 ratings and how many reviews gave each rating
+    problem_solving_sum = models.PositiveIntegerField(default=0)
+    problem_solving_histogram = models.JSONField(default=empty_histogram)
+    communication_sum = models.PositiveIntegerField(default=0)
+    communication_histogram = models.JSONField(default=empty_histogram)
+    sociability_sum = models.PositiveIntegerField(default=0)
+    sociability_histogram = models.JSONField(default=empty_histogram)
+
+    upvotes_total = models.IntegerField(default=0)
+    downvotes_total = models.IntegerField(default=0)
+
+    def apply(self, ratings, sign):
+        """Adds (sign=1) or takes away (sign=-1) one review's `ratings`."""
+        self.review_count += sign
+        for (criterion, _), rating in zip(Review.RATING_FIELDS, ratings):
+            if 1 <= rating <= 5:
+                setattr(self, f'{criterion}_sum', getattr(self, f'{criterion}_sum') + sign * rating)
+                getattr(self, f'{criterion}_histogram')[rating - 1] += sign
+
+    def summary(self):
+        from . import review_criteria
+
+        criteria = []
+        for criterion, _ in Review.RATING_FIELDS:
+            histogram = getattr(self, f'{criterion}_histogram')
+            count = sum(histogram)
+            average = getattr(self, f'{criterion}_sum') / count if count else None
+            criteria.append({
+                'criterion': criterion,
+                'title': criterion.replace('_', ' ').title(),
+                'count': count,
+                'average': average,
+                'label': review_criteria.describe(criterion, round(average))[0] if count else '',
+                'histogram': histogram,
+            })
+        return criteria
+
+    def __str__(self):
+        return f'{self.user.username} ({self.review_count} reviews)'
+
+
+class OutboundEmail(models.Model):
+    """
+    An email queued by a request and delivered later by the send_queued_mail
+    command, so that no request waits on the SMTP server. The body carries
+    one-time passwords and reset links, so it is blanked once the email is
+    sent or given up on.
+    """
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    is_html = models.BooleanField(default=False)
+    from_email = models.CharField(max_length=254, blank=True)
+    to = models.JSONField(default=list)
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # when a worker may next pick the email up; pushed forward while one is sending it
+    next_attempt = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created = models.DateTimeField(default=timezone.now)
+    sent = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt'], name='main_outbound_due'),
+        ]
+
+    def __str__(self):
+        return f'{self.subject} to {", ".join(self.to)} ({self.status})'
+
+
+class ImageJob(models.Model):
+    """
+    Profile image work taken off the request: resizing and storing a staged
+    upload, or deleting replaced assets. Run by the process_image_jobs command.
+    """
+    UPLOAD = 'upload'
+    DELETE = 'delete'
+    KIND_CHOICES = [
+        (UPLOAD, 'Upload'),
+        (DELETE, 'Delete'),
+    ]
+
+    PENDING = 'pending'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    # kept when the profile goes, so its assets still get deleted
+    profile = models.ForeignKey(UserProfile, on_delete=models.SET_NULL, null=True, blank=True, related_name='image_jobs')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    # staging storage name of an upload
+    staged = models.CharField(max_length=255, blank=True)
+    # storage names to delete
+    names = models.JSONField(default=list, blank=True)
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # when a worker may next pick the job up; pushed forward while one is running it
+    next_attempt = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created = models.DateTimeField(default=timezone.now)
+    finished = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt'], name='main_imagejob_due'),
+        ]
+
+    def __str__(self):
+        return f'{self.kind} {self.status} ({self.profile})'
+
+
+class ImageBlob(models.Model):
+    """
+    One stored profile image file, shared by every upload or variant with the
+    same content and deleted with its last reference. See
+    main.storage.ContentAddressedStorage.
+    """
+    digest = models.CharField(max_length=64, unique=True)
+    name = models.CharField(max_length=255, unique=True)
+    references = models.PositiveIntegerField(default=0)
+    created = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f'{self.name} ({self.references})'
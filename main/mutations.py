@@ -0,0 +1,14 @@
+def save_changed(instance, **values):
+    """
+    Assigns `values` to `instance` and writes only the fields whose value
+    actually changed, as one UPDATE (no query at all when nothing changed).
+    Returns the names of the changed fields.
+    """
+    changed = [name for name, value in values.items() if getattr(instance, name) != value]
+    for name in changed:
+        setattr(instance, name, values[name])
+
+    if changed:
+        instance.save(update_fields=changed)
+
+    return changed
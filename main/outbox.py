@@ -0,0 +1,70 @@
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.utils import timezone
+
+from . import models
+from . import queues
+
+BATCH_SIZE = 50
+MAX_ATTEMPTS = 6
+
+
+def enqueue(subject, body, to, from_email=None, html=False):
+    """Queues an email for the send_queued_mail worker instead of sending it inline."""
+    return models.OutboundEmail.objects.create(
+        subject=subject,
+        body=body,
+        to=list(to),
+        from_email=from_email or settings.EMAIL_HOST_USER or '',
+        is_html=html,
+    )
+
+
+def _message(email, connection):
+    message = EmailMessage(email.subject, email.body, email.from_email or None, email.to, connection=connection)
+    if email.is_html:
+        message.content_subtype = 'html'
+    return message
+
+
+def send_batch(batch_size=BATCH_SIZE):
+    """
+    Sends up to `batch_size` due emails over a single connection to the mail
+    server and returns (sent, failed). Failed emails are retried with
+    exponential backoff until MAX_ATTEMPTS, after which they are left marked
+    as failed. Either way the body is blanked once the email is settled.
+    """
+    emails = queues.claim(models.OutboundEmail, batch_size)
+    if not emails:
+        return 0, 0
+
+    sent = failed = 0
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as error:
+        for email in emails:
+            _failed(email, error)
+        return 0, len(emails)
+
+    try:
+        for email in emails:
+            try:
+                connection.send_messages([_message(email, connection)])
+            except Exception as error:
+                _failed(email, error)
+                failed += 1
+            else:
+                # the body holds one-time passwords and reset links, not worth keeping
+                models.OutboundEmail.objects.filter(id=email.id).update(
+                    status=models.OutboundEmail.SENT, sent=timezone.now(), last_error='', body='',
+                )
+                sent += 1
+    finally:
+        connection.close()
+
+    return sent, failed
+
+
+def _failed(email, error):
+    queues.retry_or_fail(email, error, MAX_ATTEMPTS, body='')
@@ -0,0 +1,91 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+
+from . import models
+from . import thumbnails
+
+HITS_KEY = 'profile_header:hits'
+MISSES_KEY = 'profile_header:misses'
+
+# the User and UserProfile fields a header is built from
+USER_FIELDS = {'username', 'first_name', 'last_name'}
+PROFILE_FIELDS = {'profile_image', 'image_variants', 'contact_number', 'bio', 'gender'}
+
+
+def _key(user_id):
+    return f'profile_header:{user_id}'
+
+
+def _username_key(username):
+    return f'profile_header:username:{username}'
+
+
+def _count(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+
+
+def _build(user):
+    try:
+        profile = user.userprofile
+    except models.UserProfile.DoesNotExist:
+        profile = None
+
+    return {
+        'id': user.id,
+        'username': user.username,
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+        'images': thumbnails.urls(profile) if profile else {},
+        'gender': profile.gender if profile else 'N',
+        'contact_number': profile.contact_number if profile else '',
+        'bio': profile.bio if profile else '',
+    }
+
+
+def get_header(user=None, username=None):
+    """
+    Returns the profile header of `user` (or of the user called `username`)
+    as a plain dict, from the cache when possible. Returns None for an
+    unknown username.
+    """
+    user_id = user.pk if user is not None else cache.get(_username_key(username))
+    header = cache.get(_key(user_id)) if user_id is not None else None
+
+    if header is not None:
+        _count(HITS_KEY)
+        return header
+
+    _count(MISSES_KEY)
+    if user is None:
+        try:
+            user = User.objects.select_related('userprofile').get(username=username)
+        except User.DoesNotExist:
+            return None
+
+    header = _build(user)
+    cache.set_many({_key(user.pk): header, _username_key(user.username): user.pk}, settings.PROFILE_HEADER_CACHE_TIMEOUT)
+    return header
+
+
+def header_user(header):
+    """A User standing in for the header's user in queries and templates, without loading it."""
+    user = User(id=header['id'], username=header['username'], first_name=header['first_name'], last_name=header['last_name'])
+    user._state.adding = False
+    return user
+
+
+def invalidate(user_id, username=None):
+    keys = [_key(user_id)]
+    if username is not None:
+        keys.append(_username_key(username))
+    cache.delete_many(keys)
+
+
+def stats():
+    counts = cache.get_many([HITS_KEY, MISSES_KEY])
+    return {'hits': counts.get(HITS_KEY, 0), 'misses': counts.get(MISSES_KEY, 0)}
@@ -0,0 +1,52 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+# a claimed item is retried by another worker if not settled within this time
+LEASE = timedelta(minutes=5)
+
+
+def backoff(attempts):
+    """Delay before retrying an item that has failed `attempts` times: 30s doubling up to an hour."""
+    return timedelta(seconds=min(30 * 2 ** (attempts - 1), 3600))
+
+
+def claim(model, batch_size, lease=LEASE):
+    """
+    Claims up to `batch_size` due items of `model`, a queue like the outbox
+    or the image jobs with `status`, `attempts`, `next_attempt` and
+    `last_error` fields, oldest first, and returns them with their attempt
+    counted. Rows locked by another worker are skipped, and a claimed item
+    falls due again once `lease` has passed, so that a worker dying mid-item
+    doesn't lose it.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            model.objects
+            .select_for_update(skip_locked=True)
+            .filter(status=model.PENDING, next_attempt__lte=now)
+            .order_by('next_attempt', 'id')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        model.objects.filter(id__in=ids).update(next_attempt=now + lease, attempts=F('attempts') + 1)
+
+    return list(model.objects.filter(id__in=ids).order_by('id'))
+
+
+def retry_or_fail(item, error, max_attempts, **on_failure):
+    """
+    Records `error` on a claimed item and schedules a retry with exponential
+    backoff, or after `max_attempts` marks it as failed and applies the
+    `on_failure` field updates.
+    """
+    model = type(item)
+    updates = {'last_error': f'{type(error).__name__}: {error}'}
+    if item.attempts >= max_attempts:
+        updates['status'] = model.FAILED
+        updates.update(on_failure)
+    else:
+        updates['next_attempt'] = timezone.now() + backoff(item.attempts)
+    model.objects.filter(id=item.id).update(**updates)
@@ -0,0 +1,107 @@
+from datetime import datetime
+
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from . import identity
+from . import models
+from . import vote_buffer
+
+PAGE_SIZE = 10
+
+
+def load_review_cards(reviews, viewer):
+    """
+    Returns the cards for `reviews` as rendered by the profile templates.
+
+    The viewer's own vote state is annotated onto the review query, the
+    giver/receiver come along through select_related and the vote counts are
+    stored on the review itself, so the whole list costs one query regardless
+    of its length.
+    """
+    upvotes = models.Review.upvotes.through
+    downvotes = models.Review.downvotes.through
+
+    reviews = reviews.select_related('to_user', 'from_user').annotate(
+        card_has_upvoted=Exists(upvotes.objects.filter(review=OuterRef('pk'), user=viewer.pk)),
+        card_has_downvoted=Exists(downvotes.objects.filter(review=OuterRef('pk'), user=viewer.pk)),
+    )
+
+    cards = []
+    for review in reviews:
+        review.to_user = identity.canonical(review.to_user)
+        review.from_user = identity.canonical(review.from_user)
+        cards.append({
+            'review': review,
+            'upvotes_count': review.upvotes_count,
+            'downvotes_count': review.downvotes_count,
+            'has_upvoted': review.card_has_upvoted,
+            'has_downvoted': review.card_has_downvoted,
+            'giver': review.review_giver(),
+            'receiver': review.review_receiver(),
+        })
+
+    if vote_buffer.enabled():
+        cards = [vote_buffer.buffer.merge(card, viewer.pk) for card in cards]
+
+    return cards
+
+
+def review_feed(section, profile_user, viewer):
+    """
+    Returns the reviews listed under `section` ('received' or 'given') on
+    `profile_user`'s profile as seen by `viewer`. On someone else's profile the
+    viewer's own review is pinned separately, so it is left out of the feed.
+    """
+    reviews = models.Review.objects.all()
+
+    if section == 'received':
+        reviews = reviews.filter(to_user=profile_user)
+        if profile_user != viewer:
+            reviews = reviews.exclude(from_user=viewer)
+    else:
+        reviews = reviews.filter(from_user=profile_user)
+        if profile_user != viewer:
+            reviews = reviews.filter(is_anonymous=False).exclude(to_user=viewer)
+
+    return reviews
+
+
+def _encode_cursor(review):
+    return f'{review.created.isoformat()}|{review.id}'
+
+
+def _decode_cursor(cursor):
+    created, review_id = cursor.rsplit('|', 1)
+    created, review_id = datetime.fromisoformat(created), int(review_id)
+    # cursors come back from the client, so a forged one must fail as malformed, not in the database
+    if timezone.is_naive(created):
+        raise ValueError(f'Cursor time without a timezone: {created}')
+    # review ids are BigAutoField values
+    if not 0 < review_id < 2 ** 63:
+        raise ValueError(f'Cursor review id out of range: {review_id}')
+    return created, review_id
+
+
+def load_review_page(reviews, viewer, after=None, size=PAGE_SIZE):
+    """
+    Returns one page of cards for `reviews`, newest first, along with the cursor
+    of the next page (None on the last one).
+
+    Pages are keyed on (created, id) rather than offsets, so every page is an
+    index range scan of the same cost no matter how deep into the feed it is.
+    Raises ValueError for a malformed cursor.
+    """
+    reviews = reviews.order_by('-created', '-id')
+
+    if after:
+        created, review_id = _decode_cursor(after)
+        reviews = reviews.filter(Q(created__lt=created) | Q(created=created, id__lt=review_id))
+
+    cards = load_review_cards(reviews[:size + 1], viewer)
+
+    if len(cards) > size:
+        cards = cards[:size]
+        return cards, _encode_cursor(cards[-1]['review'])
+
+    return cards, None
@@ -1,3 +1,5 @@
+from types import MappingProxyType
+
 problem_solving = {
     1 : {
         'name': 'Thinker',
@@ -80,3 +82,26 @@ sociability = {
         'description': "Prioritizes others' well-being, generous, supportive, and actively helps others.",
     }
 }
+
+
+def _compile(criterion):
+    # index 0 is "not rated"
+    return (None,) + tuple((criterion[rating]['name'], criterion[rating]['description']) for rating in range(1, 6))
+
+
+# (name, description) of every rating, indexed by rating, built once at import
+TABLES = MappingProxyType({
+    'problem_solving': _compile(problem_solving),
+    'communication': _compile(communication),
+    'sociability': _compile(sociability),
+})
+
+
+def describe(criterion, rating):
+    """
+    Returns the (name, description) pair of `rating` on `criterion`, or None
+    when unrated or out of range.
+    """
+    if not isinstance(rating, int) or not 1 <= rating <= 5:
+        return None
+    return TABLES[criterion][rating]
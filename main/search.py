@@ -0,0 +1,261 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import Q
+from django.urls import reverse
+
+from . import identity
+
+PAGE_SIZE = 20
+
+SUGGEST_LIMIT = 8
+SUGGEST_CACHE_SIZE = 1024
+# other worker processes only see a rename once their entries expire
+SUGGEST_CACHE_TTL = 60
+
+FTS_TABLE = 'main_usersearch'
+TRIGRAM_INDEX = 'main_auth_user_name_trgm'
+
+# the expression the trigram index is built on; queries must use it verbatim
+NAME_EXPRESSION = "lower(auth_user.first_name || ' ' || auth_user.last_name)"
+
+
+def _tokens(query):
+    return query.lower().split()[:5]
+
+
+def _escape_like(token):
+    return token.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+class SearchBackend:
+    """
+    Plain ORM search, used when the database has no search index. Matches every
+    query word against the start of the first or last name.
+    """
+
+    def index(self, user):
+        pass
+
+    def remove(self, user_id):
+        pass
+
+    def ranked_ids(self, tokens, exclude_id, limit, offset):
+        users = User.objects.exclude(is_superuser=True).exclude(pk=exclude_id)
+        for token in tokens:
+            users = users.filter(Q(first_name__istartswith=token) | Q(last_name__istartswith=token))
+        return list(users.order_by('first_name', 'last_name', 'id').values_list('id', flat=True)[offset:offset + limit])
+
+
+class TrigramSearchBackend(SearchBackend):
+    """
+    PostgreSQL search over a pg_trgm GIN index on the lowercased full name. The
+    index lives on auth_user itself, so it never needs updating by hand.
+    """
+
+    def ranked_ids(self, tokens, exclude_id, limit, offset):
+        conditions = ['NOT auth_user.is_superuser']
+        params = []
+        for token in tokens:
+            conditions.append(f"({NAME_EXPRESSION} LIKE %s OR {NAME_EXPRESSION} LIKE %s)")
+            params += [f'{_escape_like(token)}%', f'% {_escape_like(token)}%']
+        if exclude_id is not None:
+            conditions.append('auth_user.id <> %s')
+            params.append(exclude_id)
+
+        sql = f"""
+            SELECT auth_user.id FROM auth_user
+            WHERE {' AND '.join(conditions)}
+            ORDER BY similarity({NAME_EXPRESSION}, %s) DESC, auth_user.id
+            LIMIT %s OFFSET %s
+        """
+        params += [' '.join(tokens), limit, offset]
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [row[0] for row in cursor.fetchall()]
+
+
+class FTS5SearchBackend(SearchBackend):
+    """
+    SQLite search over an FTS5 shadow table of user names, ranked by bm25. Rows
+    are keyed by user id and kept current from the User save/delete signals.
+    """
+
+    def index(self, user):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [user.pk])
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, first_name, last_name) VALUES (%s, %s, %s)',
+                [user.pk, user.first_name, user.last_name],
+            )
+
+    def remove(self, user_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [user_id])
+
+    def ranked_ids(self, tokens, exclude_id, limit, offset):
+        conditions = [f'{FTS_TABLE} MATCH %s', 'NOT auth_user.is_superuser']
+        params = [' '.join('"{}"*'.format(token.replace('"', '""')) for token in tokens)]
+        if exclude_id is not None:
+            conditions.append('auth_user.id <> %s')
+            params.append(exclude_id)
+
+        sql = f"""
+            SELECT auth_user.id FROM {FTS_TABLE}
+            JOIN auth_user ON auth_user.id = {FTS_TABLE}.rowid
+            WHERE {' AND '.join(conditions)}
+            ORDER BY {FTS_TABLE}.rank, auth_user.id
+            LIMIT %s OFFSET %s
+        """
+        params += [limit, offset]
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [row[0] for row in cursor.fetchall()]
+
+
+_backends = {}
+
+
+def get_backend():
+    """
+    Picks the backend for the default database once per process, falling back
+    to the plain ORM search when the index migration could not create its
+    index (e.g. SQLite built without FTS5).
+    """
+    if connection.alias not in _backends:
+        table_names = connection.introspection.table_names()
+        if connection.vendor == 'sqlite' and FTS_TABLE in table_names:
+            _backends[connection.alias] = FTS5SearchBackend()
+        elif connection.vendor == 'postgresql' and _has_trigram_index():
+            _backends[connection.alias] = TrigramSearchBackend()
+        else:
+            _backends[connection.alias] = SearchBackend()
+
+    return _backends[connection.alias]
+
+
+def _has_trigram_index():
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1 FROM pg_indexes WHERE indexname = %s', [TRIGRAM_INDEX])
+        return cursor.fetchone() is not None
+
+
+def search_users(query, viewer, page=1, page_size=PAGE_SIZE):
+    """
+    Returns a page of users matching every word of `query` as a name prefix,
+    best match first, along with whether a further page exists. The viewer and
+    superusers are never listed.
+    """
+    tokens = _tokens(query)
+    if not tokens:
+        return [], False
+
+    offset = (page - 1) * page_size
+    ids = get_backend().ranked_ids(tokens, viewer.pk, page_size + 1, offset)
+    has_next = len(ids) > page_size
+    ids = ids[:page_size]
+
+    users = User.objects.select_related('userprofile').in_bulk(ids)
+    return [identity.canonical(users[user_id]) for user_id in ids if user_id in users], has_next
+
+
+class PrefixCache:
+    """
+    A bounded, thread-safe LRU map from a normalized search prefix to its
+    suggestions, with entries expiring after `ttl` seconds.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard_if(self, predicate):
+        with self._lock:
+            for key in [key for key, (_, value) in self._entries.items() if predicate(key, value)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+suggestion_cache = PrefixCache(SUGGEST_CACHE_SIZE, SUGGEST_CACHE_TTL)
+
+
+def suggest_users(prefix, viewer, limit=SUGGEST_LIMIT):
+    """
+    Returns up to `limit` users matching `prefix` as plain dicts for the
+    typeahead. Suggestions are cached per prefix for all viewers (one extra
+    entry is kept so that dropping the viewer still leaves `limit`).
+    """
+    tokens = _tokens(prefix)
+    if not tokens:
+        return []
+
+    key = ' '.join(tokens)
+    suggestions = suggestion_cache.get(key)
+
+    if suggestions is None:
+        ids = get_backend().ranked_ids(tokens, None, limit + 1, 0)
+        users = User.objects.in_bulk(ids)
+        suggestions = [
+            {
+                'id': users[user_id].id,
+                'username': users[user_id].username,
+                'name': f'{users[user_id].first_name} {users[user_id].last_name}',
+                'url': reverse('main:user', kwargs={'username': users[user_id].username}),
+            }
+            for user_id in ids if user_id in users
+        ]
+        suggestion_cache.set(key, suggestions)
+
+    return [suggestion for suggestion in suggestions if suggestion['id'] != viewer.pk][:limit]
+
+
+def invalidate_suggestions(user, names):
+    """
+    Drops the cached prefixes that may list `user` or should now list them,
+    given the user's old and new `names`.
+    """
+    words = {word for name in names for word in name.lower().split()}
+
+    def affected(key, suggestions):
+        if any(suggestion['id'] == user.pk for suggestion in suggestions):
+            return True
+        return all(any(word.startswith(token) for word in words) for token in key.split())
+
+    suggestion_cache.discard_if(affected)
+
+
+def index_user(user):
+    get_backend().index(user)
+
+
+def remove_user(user_id):
+    get_backend().remove(user_id)
@@ -0,0 +1,72 @@
+import copy
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+
+from . import identity
+
+
+def _timeout():
+    # seconds a session user stays cached; 0 turns the cache off
+    return settings.SESSION_USER_CACHE_TIMEOUT
+
+
+def _key(user_id):
+    return f'session_user:{user_id}'
+
+
+def _without_password(user):
+    """
+    A copy of `user`, and of its joined profile, with the password hash
+    deferred, so that it can go into a cache shared with other services.
+    """
+    user = copy.copy(user)
+    del user.password
+
+    profile_cache = User.userprofile.related
+    if profile_cache.is_cached(user) and profile_cache.get_cached_value(user) is not None:
+        # the profile's cached user is still the one with the password
+        profile = copy.copy(profile_cache.get_cached_value(user))
+        profile_cache.field.set_cached_value(profile, user)
+        profile_cache.set_cached_value(user, profile)
+    return user
+
+
+def _with_session_auth_hash(user, session_auth_hash):
+    """
+    Has `user` answer get_session_auth_hash() with the one computed before its
+    password was dropped, which the session is checked against on every
+    request, rather than loading the password for it.
+    """
+    def get_session_auth_hash():
+        # loaded or set anew, e.g. by a password change, which needs the new hash
+        if 'password' in user.__dict__:
+            return User.get_session_auth_hash(user)
+        return session_auth_hash
+
+    user.get_session_auth_hash = get_session_auth_hash
+    return user
+
+
+def get_user(user_id):
+    """
+    Returns the user behind a session, its profile joined in, from the cache
+    when possible so an authenticated request needn't query for it. A cached
+    user's password is loaded only if something asks for it. Raises
+    User.DoesNotExist like User.objects.get().
+    """
+    timeout = _timeout()
+    if not timeout:
+        return identity.get_user(pk=user_id)
+
+    cached = cache.get(_key(user_id))
+    if cached is None:
+        user = identity.get_user(pk=user_id)
+        cache.set(_key(user_id), (_without_password(user), user.get_session_auth_hash()), timeout)
+        return user
+    return identity.canonical(_with_session_auth_hash(*cached))
+
+
+def invalidate(user_id):
+    cache.delete(_key(user_id))
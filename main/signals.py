@@ -0,0 +1,62 @@
+from django.contrib.auth.models import User
+from django.contrib.auth.signals import user_logged_out
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from . import models
+from . import profile_headers
+from . import search
+from . import session_users
+
+
+@receiver(post_save, sender=User)
+def index_user_name(sender, instance, created, update_fields=None, **kwargs):
+    # e.g. login() only touches last_login
+    if update_fields is not None and not {'first_name', 'last_name'} & set(update_fields):
+        return
+    search.index_user(instance)
+    # renames are invalidated by the profile form, which knows the old names
+    if created:
+        search.invalidate_suggestions(instance, [instance.first_name, instance.last_name])
+
+
+@receiver(post_delete, sender=User)
+def unindex_user_name(sender, instance, **kwargs):
+    search.remove_user(instance.pk)
+    search.invalidate_suggestions(instance, [instance.first_name, instance.last_name])
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_header(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not profile_headers.USER_FIELDS & set(update_fields):
+        return
+    profile_headers.invalidate(instance.pk, instance.username)
+
+
+@receiver(post_save, sender=models.UserProfile)
+@receiver(post_delete, sender=models.UserProfile)
+def invalidate_profile_header(sender, instance, update_fields=None, **kwargs):
+    # covers ProfileForm image uploads and removals too, which save the profile
+    if update_fields is not None and not profile_headers.PROFILE_FIELDS & set(update_fields):
+        return
+    profile_headers.invalidate(instance.user_id)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_session_user(sender, instance, **kwargs):
+    # any saved field may be read off request.user, the password hash included
+    session_users.invalidate(instance.pk)
+
+
+@receiver(post_save, sender=models.UserProfile)
+@receiver(post_delete, sender=models.UserProfile)
+def invalidate_session_user_profile(sender, instance, **kwargs):
+    session_users.invalidate(instance.user_id)
+
+
+@receiver(user_logged_out)
+def forget_session_user(sender, request, user, **kwargs):
+    if user is not None:
+        session_users.invalidate(user.pk)
@@ -0,0 +1,69 @@
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+
+from . import models
+
+# everything record_review() may change, i.e. all but the id and user
+STATS_FIELDS = [
+    field.name for field in models.UserSkillStats._meta.concrete_fields
+    if not field.primary_key and field.name != 'user'
+]
+
+
+def record_review(user_id, old_ratings=None, new_ratings=None, votes=(0, 0)):
+    """
+    Moves `user_id`'s stats from `old_ratings` to `new_ratings` (either None
+    for a review being created or deleted) and adds the (upvotes, downvotes)
+    deltas in `votes`. The stats row is locked for the read-modify-write.
+    """
+    with transaction.atomic():
+        stats, _ = models.UserSkillStats.objects.select_for_update().get_or_create(user_id=user_id)
+        if old_ratings is not None:
+            stats.apply(old_ratings, -1)
+        if new_ratings is not None:
+            stats.apply(new_ratings, 1)
+        stats.upvotes_total += votes[0]
+        stats.downvotes_total += votes[1]
+        stats.save(update_fields=STATS_FIELDS)
+
+
+def review_deleted(review):
+    record_review(
+        review.to_user_id, old_ratings=review.ratings(),
+        votes=(-review.upvotes_count, -review.downvotes_count),
+    )
+
+
+def rebuild():
+    """
+    Recomputes every user's stats from scratch with one aggregate query over
+    the reviews and replaces the table contents with the result.
+    """
+    annotations = {
+        'review_count': Count('id'),
+        'upvotes_total': Sum('upvotes_count'),
+        'downvotes_total': Sum('downvotes_count'),
+    }
+    for criterion, field in models.Review.RATING_FIELDS:
+        annotations[f'{criterion}_sum'] = Sum(field, filter=Q(**{f'{field}__range': (1, 5)}), default=0)
+        for rating in range(1, 6):
+            annotations[f'{criterion}_{rating}'] = Count('id', filter=Q(**{field: rating}))
+
+    stats = []
+    for row in models.Review.objects.order_by().values('to_user').annotate(**annotations):
+        user_stats = models.UserSkillStats(
+            user_id=row['to_user'],
+            review_count=row['review_count'],
+            upvotes_total=row['upvotes_total'],
+            downvotes_total=row['downvotes_total'],
+        )
+        for criterion, _ in models.Review.RATING_FIELDS:
+            setattr(user_stats, f'{criterion}_sum', row[f'{criterion}_sum'])
+            setattr(user_stats, f'{criterion}_histogram', [row[f'{criterion}_{rating}'] for rating in range(1, 6)])
+        stats.append(user_stats)
+
+    with transaction.atomic():
+        models.UserSkillStats.objects.all().delete()
+        models.UserSkillStats.objects.bulk_create(stats, batch_size=1000)
+
+    return len(stats)
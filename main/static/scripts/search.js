@@ -0,0 +1,42 @@
+var suggestUrl = document.currentScript.dataset.suggestUrl;
+
+$(document).ready(function() {
+    var suggestions = $('#search-suggestions');
+    var suggestTimer = null;
+
+    $('.search-form input[name="q"]').on('input', function() {
+        var prefix = $(this).val();
+        clearTimeout(suggestTimer);
+
+        if (!prefix.trim()) {
+            suggestions.empty().hide();
+            return;
+        }
+
+        suggestTimer = setTimeout(function() {
+            $.ajax({
+                url: suggestUrl,
+                type: 'GET',
+                data: {
+                    'q': prefix,
+                },
+                success: function(response) {
+                    suggestions.empty();
+                    $.each(response.users, function(i, user) {
+                        suggestions.append($('<a>').attr('href', user.url).text(user.name));
+                    });
+                    suggestions.toggle(response.users.length > 0);
+                },
+                error: function(response) {
+                    console.log(response)
+                }
+            });
+        }, 150);
+    });
+
+    $(document).on('click', function(e) {
+        if (!$(e.target).closest('.search-form').length) {
+            suggestions.hide();
+        }
+    });
+});
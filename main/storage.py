@@ -0,0 +1,118 @@
+import hashlib
+import os
+from urllib.request import urlopen
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import Storage
+from django.db import transaction
+from django.db.models import F
+from django.utils.deconstruct import deconstructible
+
+from . import models
+
+
+@deconstructible
+class CloudinaryStorage(Storage):
+    """
+    Keeps files as Cloudinary image assets whose public id is the file's path
+    without its extension, e.g. for the generated profile image variants.
+    Names are expected to be unique, so saving never checks what exists.
+    """
+
+    def _split(self, name):
+        public_id, extension = os.path.splitext(name)
+        return public_id, extension.lstrip('.')
+
+    def _save(self, name, content):
+        from cloudinary import uploader
+
+        public_id, extension = self._split(name)
+        content.seek(0)
+        uploader.upload(content, public_id=public_id, format=extension, resource_type='image', overwrite=True)
+        return name
+
+    def _open(self, name, mode='rb'):
+        with urlopen(self.url(name)) as response:
+            return ContentFile(response.read(), name=name)
+
+    def delete(self, name):
+        from cloudinary import uploader
+
+        uploader.destroy(self._split(name)[0], invalidate=True)
+
+    def exists(self, name):
+        return False
+
+    def url(self, name):
+        from cloudinary import CloudinaryImage
+
+        public_id, extension = self._split(name)
+        return CloudinaryImage(public_id).build_url(format=extension, secure=True)
+
+
+@deconstructible
+class ContentAddressedStorage(Storage):
+    """
+    Stores files in `backend` under the SHA-256 of their content, so that
+    identical files are kept once and served from one URL. Every save adds a
+    reference to the file, whatever name it was asked for, and every delete
+    drops one; the file itself goes with its last reference. Files saved
+    before this storage was used are deleted from the backend outright.
+    """
+
+    def __init__(self, backend, prefix='profile_images'):
+        self.backend = backend
+        self.prefix = prefix
+
+    def _digest(self, content):
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        return digest.hexdigest()
+
+    def get_available_name(self, name, max_length=None):
+        # the stored name comes from the content, never from this one
+        return name
+
+    def _save(self, name, content):
+        digest = self._digest(content)
+        extension = os.path.splitext(name)[1].lower()
+
+        with transaction.atomic():
+            blob, created = models.ImageBlob.objects.select_for_update().get_or_create(
+                digest=digest, defaults={'name': f'{self.prefix}/{digest[:2]}/{digest}{extension}'},
+            )
+            if created:
+                # the backend may store it under another name, e.g. next to a file left by a rolled back save
+                stored_name = self.backend.save(blob.name, content)
+                if stored_name != blob.name:
+                    blob.name = stored_name
+                    blob.save(update_fields=['name'])
+            models.ImageBlob.objects.filter(pk=blob.pk).update(references=F('references') + 1)
+        return blob.name
+
+    def delete(self, name):
+        with transaction.atomic():
+            blob = models.ImageBlob.objects.select_for_update().filter(name=name).first()
+            if blob is None:
+                self.backend.delete(name)
+            elif blob.references > 1:
+                models.ImageBlob.objects.filter(pk=blob.pk).update(references=F('references') - 1)
+            else:
+                # still under the row lock, so a concurrent save of the same content waits and re-stores it
+                self.backend.delete(name)
+                blob.delete()
+
+    def _open(self, name, mode='rb'):
+        return self.backend.open(name, mode)
+
+    def exists(self, name):
+        return self.backend.exists(name)
+
+    def size(self, name):
+        return self.backend.size(name)
+
+    def url(self, name):
+        return self.backend.url(name)
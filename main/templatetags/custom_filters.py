@@ -1,7 +1,44 @@
 from django import template
+from django.utils.html import format_html, json_script
+
+from main import models
+from main import review_criteria
+from main import thumbnails
 
 register = template.Library()
 
-@register.filter
-def dict_lookup(dictionary, key):
-    return dictionary.get(key)
\ No newline at end of file
+# the criteria tables as the rating sliders' scripts read them, rendered once
+CRITERIA_SCRIPT = json_script(
+    {
+        criterion: [None] + [{'name': name, 'description': description} for name, description in table[1:]]
+        for criterion, table in review_criteria.TABLES.items()
+    },
+    'review-criteria',
+)
+
+@register.simple_tag
+def criterion_label(criterion, rating):
+    """Renders "name : description" for `rating` on `criterion` in one lookup."""
+    entry = review_criteria.describe(criterion, rating)
+    if entry is None:
+        return ''
+    return format_html('{} : {}', *entry)
+
+@register.simple_tag
+def criteria_script():
+    return CRITERIA_SCRIPT
+
+@register.inclusion_tag('main/profile_picture.html')
+def profile_picture(source, variant, style=''):
+    """
+    Renders the `variant` (see main.thumbnails.VARIANTS) of a profile image,
+    WebP where the browser takes it, or the default image for the gender.
+    `source` is a profile header or a UserProfile.
+    """
+    if isinstance(source, models.UserProfile):
+        images, gender = thumbnails.urls(source), source.gender
+    elif isinstance(source, dict):
+        images, gender = source.get('images', {}), source.get('gender')
+    else:
+        images, gender = {}, None
+    return {'image': images.get(variant), 'gender': gender, 'style': style}
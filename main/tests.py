@@ -1,3 +1,890 @@
-from django.test import TestCase
+import hashlib
+import importlib
+import io
+import os
+import pickle
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import OperationalError, connection
+from django.test import AsyncClient, Client, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+import numpy as np
+from PIL import Image
+
+from . import forms
+from . import image_jobs
+from . import models
+from . import outbox
+from . import queues
+from . import review_cards
+from . import search
+from . import session_users
+from . import skill_stats
+from . import thumbnails
+from . import vote_buffer
+from .assets import MINIFIERS, MinifiedManifestStaticFilesStorage, minify_js
+from .management.commands import review_analytics
+
+
+class MinifyJsTests(SimpleTestCase):
+    def test_strips_indentation_blank_lines_and_comments(self):
+        source = 'function f() {\n    // a comment\n\n    return 1;  \n}\n'
+        self.assertEqual(minify_js(source), 'function f() {\nreturn 1;\n}\n')
+
+    def test_backtick_in_string_literal(self):
+        source = 'const quote = "it\'s a `";\n    done();\n'
+        self.assertEqual(minify_js(source), 'const quote = "it\'s a `";\ndone();\n')
+
+    def test_backtick_in_regex_and_comments(self):
+        source = 'const r = /[`\'"]/g;\n    // don\'t `\n    /* ` */\n    done();\n'
+        self.assertEqual(minify_js(source), 'const r = /[`\'"]/g;\n/* ` */\ndone();\n')
+
+    def test_keeps_template_literal_whitespace(self):
+        source = 'const html = `\n    <p>  \n\n    ${items.map(item => `<b>${item}</b>`).join(\'\')}\n`;\n    done();\n'
+        self.assertEqual(
+            minify_js(source),
+            'const html = `\n    <p>  \n\n    ${items.map(item => `<b>${item}</b>`).join(\'\')}\n`;\ndone();\n',
+        )
+
+    def test_division_is_not_a_regex(self):
+        source = 'const x = a / b, y = "`";\n    done();\n'
+        self.assertEqual(minify_js(source), 'const x = a / b, y = "`";\ndone();\n')
+
+
+class CollectedStaticFilesTests(TestCase):
+    """The committed STATIC_ROOT, as the manifest storage serves it in production."""
+
+    def test_pages_render_with_the_manifest(self):
+        self.assertIsInstance(staticfiles_storage, MinifiedManifestStaticFilesStorage)
+        response = self.client.get('/signup/')
+        self.assertContains(response, staticfiles_storage.url('styles/signup.css'))
+
+        for username in ('alice', 'bob'):
+            user = User.objects.create_user(username, f'{username}@example.com')
+            models.UserProfile.objects.create(user=user, contact_number='9999999999')
+        self.client.force_login(user)
+        for url in ('/home/', '/user/alice/', '/search/?q=ali'):
+            self.assertEqual(self.client.get(url).status_code, 200, url)
+
+    def test_collected_files_are_current(self):
+        # a stale or missing copy means build_assets wasn't run after editing the source
+        sources = [
+            (path, storage) for finder in finders.get_finders() for path, storage in finder.list(None)
+            if path.startswith(MinifiedManifestStaticFilesStorage.minify_prefixes)
+        ]
+        self.assertTrue(sources)
+        for path, storage in sources:
+            with storage.open(path) as file:
+                minified = MINIFIERS[os.path.splitext(path)[1]](file.read().decode('utf-8'))
+            with staticfiles_storage.open(staticfiles_storage.stored_name(path)) as file:
+                self.assertEqual(file.read().decode('utf-8'), minified, path)
+
+
+class OutboxTests(TestCase):
+    # the test runner swaps in the locmem mail backend, which collects sent mail in mail.outbox
+
+    def setUp(self):
+        self.email = outbox.enqueue('Your OTP', 'Your code is 123456', ['alice@example.com'])
+
+    def make_due(self):
+        models.OutboundEmail.objects.update(next_attempt=timezone.now())
+
+    def test_backoff_doubles_up_to_an_hour(self):
+        self.assertEqual(
+            [queues.backoff(attempts).total_seconds() for attempts in (1, 2, 3, 8, 20)],
+            [30, 60, 120, 3600, 3600],
+        )
+
+    def test_sends_and_blanks_the_body(self):
+        self.assertEqual(outbox.send_batch(), (1, 0))
+
+        self.assertEqual(mail.outbox[0].body, 'Your code is 123456')
+        self.assertEqual(mail.outbox[0].to, ['alice@example.com'])
+        email = models.OutboundEmail.objects.get()
+        self.assertEqual(email.status, models.OutboundEmail.SENT)
+        self.assertEqual(email.body, '')
+        self.assertIsNotNone(email.sent)
+        self.assertEqual(outbox.send_batch(), (0, 0))
+
+    @mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError('mail server down'))
+    def test_retries_with_backoff(self, send_messages):
+        start = timezone.now()
+        self.assertEqual(outbox.send_batch(), (0, 1))
+
+        email = models.OutboundEmail.objects.get()
+        self.assertEqual(email.status, models.OutboundEmail.PENDING)
+        self.assertEqual(email.attempts, 1)
+        self.assertEqual(email.last_error, 'OSError: mail server down')
+        self.assertEqual(email.body, 'Your code is 123456')
+        self.assertGreaterEqual(email.next_attempt, start + timedelta(seconds=30))
+        # not due again until the backoff has passed
+        self.assertEqual(outbox.send_batch(), (0, 0))
+
+        self.make_due()
+        start = timezone.now()
+        self.assertEqual(outbox.send_batch(), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual(email.attempts, 2)
+        self.assertGreaterEqual(email.next_attempt, start + timedelta(seconds=60))
+
+        send_messages.side_effect = None
+        self.make_due()
+        self.assertEqual(outbox.send_batch(), (1, 0))
+        email.refresh_from_db()
+        self.assertEqual(email.status, models.OutboundEmail.SENT)
+        self.assertEqual(email.last_error, '')
+
+    @mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError('mail server down'))
+    def test_gives_up_after_max_attempts(self, send_messages):
+        for _ in range(outbox.MAX_ATTEMPTS):
+            self.make_due()
+            self.assertEqual(outbox.send_batch(), (0, 1))
+
+        email = models.OutboundEmail.objects.get()
+        self.assertEqual(email.status, models.OutboundEmail.FAILED)
+        self.assertEqual(email.attempts, outbox.MAX_ATTEMPTS)
+        self.assertEqual(email.body, '')
+        self.make_due()
+        self.assertEqual(outbox.send_batch(), (0, 0))
+
+    def test_claimed_email_waits_out_the_lease(self):
+        # a worker that claimed the email and died before settling it
+        self.assertEqual(queues.claim(models.OutboundEmail, 10), [self.email])
+        self.assertEqual(queues.claim(models.OutboundEmail, 10), [])
+
+        models.OutboundEmail.objects.update(next_attempt=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(outbox.send_batch(), (1, 0))
+        self.assertEqual(models.OutboundEmail.objects.get().attempts, 2)
+
+
+def image_upload(color='red', size=(300, 200)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'JPEG')
+    return SimpleUploadedFile('photo.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+
+class ImageStorageTestCase(TestCase):
+    """Runs against FileSystemStorage in a temporary directory, standing in for Cloudinary."""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        overrides = override_settings(
+            MEDIA_ROOT=os.path.join(self.root, 'media'),
+            IMAGE_STAGING_ROOT=os.path.join(self.root, 'staging'),
+            PROFILE_IMAGE_STORAGE='django.core.files.storage.FileSystemStorage',
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        thumbnails.storage.cache_clear()
+        self.addCleanup(thumbnails.storage.cache_clear)
+
+        user = User.objects.create_user('alice', 'alice@example.com')
+        self.profile = models.UserProfile.objects.create(user=user, contact_number='9999999999')
+
+    def stored_files(self):
+        return sorted(
+            os.path.relpath(os.path.join(directory, name), settings.MEDIA_ROOT)
+            for directory, _, names in os.walk(settings.MEDIA_ROOT) for name in names
+        )
+
+    def make_due(self):
+        models.ImageJob.objects.filter(status=models.ImageJob.PENDING).update(next_attempt=timezone.now())
+
+
+class ImageJobTests(ImageStorageTestCase):
+    def test_upload_switches_the_profile_image(self):
+        job = image_jobs.enqueue_upload(self.profile, image_upload())
+        self.assertTrue(image_jobs.staging().exists(job.staged))
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.image_variants, {})
+
+        self.assertEqual(image_jobs.run_batch(), (1, 0))
+
+        self.profile.refresh_from_db()
+        self.assertEqual(set(self.profile.image_variants), set(thumbnails.VARIANTS))
+        avatar = thumbnails.storage().open(self.profile.image_variants['avatar']['jpeg'])
+        self.assertEqual(Image.open(avatar).size, (200, 200))
+        self.assertFalse(image_jobs.staging().exists(job.staged))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (models.ImageJob.DONE, 1))
+
+    def test_newest_upload_wins(self):
+        image_jobs.enqueue_upload(self.profile, image_upload('red'))
+        image_jobs.enqueue_upload(self.profile, image_upload('blue', (500, 500)))
+
+        self.assertEqual(image_jobs.run_batch(), (2, 0))
+
+        self.profile.refresh_from_db()
+        full = thumbnails.storage().open(self.profile.image_variants['full']['jpeg'])
+        self.assertEqual(Image.open(full).size, (500, 500))
+
+    def test_removal_wins_over_pending_upload(self):
+        image_jobs.enqueue_upload(self.profile, image_upload())
+        image_jobs.remove(self.profile)
+        self.make_due()
+
+        self.assertEqual(image_jobs.run_batch(), (2, 0))
+
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.image_variants, {})
+        self.assertEqual(self.stored_files(), [])
+
+    @override_settings(CACHE_IS_SHARED=False, PROFILE_HEADER_CACHE_TIMEOUT=10, SESSION_USER_CACHE_TIMEOUT=30)
+    def test_replaced_files_outlive_per_process_caches(self):
+        image_jobs.enqueue_upload(self.profile, image_upload())
+        image_jobs.run_batch()
+        start = timezone.now()
+        image_jobs.remove(self.profile)
+
+        deletion = models.ImageJob.objects.get(kind=models.ImageJob.DELETE)
+        self.assertGreaterEqual(deletion.next_attempt, start + timedelta(seconds=30))
+        self.assertEqual(image_jobs.run_batch(), (0, 0))
+        self.assertNotEqual(self.stored_files(), [])
+
+    def test_failed_job_is_retried_with_backoff(self):
+        job = image_jobs.enqueue_upload(self.profile, image_upload())
+        staged = image_jobs.staging().open(job.staged).read()
+        image_jobs.staging().delete(job.staged)
+
+        start = timezone.now()
+        self.assertEqual(image_jobs.run_batch(), (0, 1))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (models.ImageJob.PENDING, 1))
+        self.assertTrue(job.last_error.startswith('FileNotFoundError'))
+        self.assertGreaterEqual(job.next_attempt, start + timedelta(seconds=30))
+        self.assertEqual(image_jobs.run_batch(), (0, 0))
+
+        # the staged file turns up again, e.g. once a shared disk is back
+        image_jobs.staging().save(job.staged, SimpleUploadedFile('photo.jpg', staged))
+        self.make_due()
+        self.assertEqual(image_jobs.run_batch(), (1, 0))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.last_error), (models.ImageJob.DONE, 2, ''))
+
+    def test_gives_up_after_max_attempts(self):
+        job = image_jobs.enqueue_upload(self.profile, image_upload())
+        image_jobs.staging().delete(job.staged)
+
+        for _ in range(image_jobs.MAX_ATTEMPTS):
+            self.make_due()
+            self.assertEqual(image_jobs.run_batch(), (0, 1))
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (models.ImageJob.FAILED, image_jobs.MAX_ATTEMPTS))
+        self.make_due()
+        self.assertEqual(image_jobs.run_batch(), (0, 0))
+
+    def test_claims_due_jobs_only_once(self):
+        first = image_jobs.enqueue_upload(self.profile, image_upload())
+        later = image_jobs.enqueue_upload(self.profile, image_upload('blue'))
+        models.ImageJob.objects.filter(id=later.id).update(next_attempt=timezone.now() + timedelta(minutes=1))
+
+        self.assertEqual(queues.claim(models.ImageJob, 10), [first])
+        # held by the lease of the worker that claimed it
+        self.assertEqual(queues.claim(models.ImageJob, 10), [])
+
+
+class ImageRefcountTests(ImageStorageTestCase):
+    def references(self):
+        return dict(models.ImageBlob.objects.values_list('name', 'references'))
+
+    def test_identical_files_are_stored_once(self):
+        storage = thumbnails.storage()
+        first = storage.save('profile_images/1/a.jpg', ContentFile(b'same bytes'))
+        second = storage.save('profile_images/2/b.jpg', ContentFile(b'same bytes'))
+
+        self.assertEqual(first, second)
+        self.assertEqual(self.references(), {first: 2})
+        self.assertEqual(self.stored_files(), [first])
+
+        storage.delete(first)
+        self.assertEqual(self.references(), {first: 1})
+        self.assertTrue(storage.exists(first))
+
+        storage.delete(second)
+        self.assertEqual(self.references(), {})
+        self.assertEqual(self.stored_files(), [])
+
+    def test_the_name_the_backend_stored_is_kept(self):
+        storage = thumbnails.storage()
+        digest = hashlib.sha256(b'new bytes').hexdigest()
+        # left behind by a save whose transaction rolled back
+        stray = f'profile_images/{digest[:2]}/{digest}.jpg'
+        storage.backend.save(stray, ContentFile(b'stray bytes'))
+
+        name = storage.save('profile_images/1/a.jpg', ContentFile(b'new bytes'))
+        self.assertNotEqual(name, stray)
+        self.assertEqual(self.references(), {name: 1})
+        with storage.open(name) as stored:
+            self.assertEqual(stored.read(), b'new bytes')
+
+        storage.delete(name)
+        self.assertEqual(self.references(), {})
+        self.assertEqual(self.stored_files(), [stray])
+
+    def test_references_follow_uploads_and_removals(self):
+        image_jobs.enqueue_upload(self.profile, image_upload())
+        image_jobs.run_batch()
+        self.profile.refresh_from_db()
+        # the original and two formats of each variant
+        self.assertEqual(sum(self.references().values()), 1 + 2 * len(thumbnails.VARIANTS))
+
+        image_jobs.remove(self.profile)
+        self.make_due()
+        image_jobs.run_batch()
+        self.assertEqual(self.references(), {})
+        self.assertEqual(self.stored_files(), [])
+
+    def test_failed_switch_releases_what_it_stored(self):
+        job = image_jobs.enqueue_upload(self.profile, image_upload())
+
+        with mock.patch.object(models.UserProfile, 'save', side_effect=RuntimeError('database down')):
+            self.assertEqual(image_jobs.run_batch(), (0, 1))
+
+        self.assertEqual(self.references(), {})
+        self.assertEqual(self.stored_files(), [])
+        # and the retry counts its files once
+        self.make_due()
+        self.assertEqual(image_jobs.run_batch(), (1, 0))
+        self.assertEqual(sum(self.references().values()), 1 + 2 * len(thumbnails.VARIANTS))
+        job.refresh_from_db()
+        self.assertEqual(job.attempts, 2)
+
+    def test_failed_variant_releases_those_already_stored(self):
+        save = type(thumbnails.storage()).save
+        calls = []
+
+        def flaky_save(storage, name, content, **kwargs):
+            calls.append(name)
+            if len(calls) == 3:
+                raise OSError('storage down')
+            return save(storage, name, content, **kwargs)
+
+        rendered = thumbnails.render(image_upload())
+        with mock.patch.object(type(thumbnails.storage()), 'save', flaky_save):
+            with self.assertRaises(OSError):
+                thumbnails.store(self.profile.user_id, rendered)
+
+        self.assertEqual(self.references(), {})
+        self.assertEqual(self.stored_files(), [])
+
+
+@mock.patch.object(vote_buffer.VoteBuffer, '_start')
+class VoteBufferTests(TestCase):
+    """Flushes by hand rather than from the buffer's background thread."""
+
+    def setUp(self):
+        self.author = User.objects.create_user('author', 'author@example.com')
+        self.receiver = User.objects.create_user('receiver', 'receiver@example.com')
+        self.voters = [User.objects.create_user(f'voter{i}', f'voter{i}@example.com') for i in range(3)]
+        self.review = models.Review.objects.create(
+            to_user=self.receiver, from_user=self.author, review_rating_1=3, review_rating_2=4, review_rating_3=5,
+        )
+        skill_stats.record_review(self.receiver.id, new_ratings=self.review.ratings())
+        self.buffer = vote_buffer.VoteBuffer(interval=1)
+
+    def stored(self):
+        review = models.Review.objects.get(pk=self.review.pk)
+        stats = models.UserSkillStats.objects.get(user=self.receiver)
+        return {
+            'counts': (review.upvotes_count, review.downvotes_count),
+            'totals': (stats.upvotes_total, stats.downvotes_total),
+            'upvoters': set(review.upvotes.values_list('id', flat=True)),
+            'downvoters': set(review.downvotes.values_list('id', flat=True)),
+        }
+
+    def test_votes_are_written_on_flush(self, start):
+        first, second, third = self.voters
+        self.assertEqual(self.buffer.vote(self.review.pk, first.id, 'upvote'), (1, 0, True, False))
+        self.assertEqual(self.buffer.vote(self.review.pk, second.id, 'upvote'), (2, 0, True, False))
+        self.assertEqual(self.buffer.vote(self.review.pk, third.id, 'downvote'), (2, 1, False, True))
+        self.assertEqual(self.stored()['counts'], (0, 0))
+
+        self.assertEqual(self.buffer.flush(), 3)
+
+        self.assertEqual(self.stored(), {
+            'counts': (2, 1),
+            'totals': (2, 1),
+            'upvoters': {first.id, second.id},
+            'downvoters': {third.id},
+        })
+        self.assertEqual(self.buffer.flush(), 0)
+
+    def test_only_the_latest_click_is_written(self, start):
+        voter = self.voters[0]
+        self.buffer.vote(self.review.pk, voter.id, 'upvote')
+        self.buffer.vote(self.review.pk, voter.id, 'downvote')
+        self.buffer.vote(self.review.pk, self.voters[1].id, 'upvote')
+        # toggled back off before the flush
+        self.buffer.vote(self.review.pk, self.voters[1].id, 'upvote')
+
+        self.buffer.flush()
+
+        self.assertEqual(self.stored(), {'counts': (0, 1), 'totals': (0, 1), 'upvoters': set(), 'downvoters': {voter.id}})
+
+    def test_toggles_votes_already_stored(self, start):
+        voter = self.voters[0]
+        self.review.upvote(voter)
+
+        self.assertEqual(self.buffer.vote(self.review.pk, voter.id, 'downvote'), (0, 1, False, True))
+        self.buffer.flush()
+
+        self.assertEqual(self.stored(), {'counts': (0, 1), 'totals': (0, 1), 'upvoters': set(), 'downvoters': {voter.id}})
+
+    def test_failed_flush_keeps_the_votes(self, start):
+        first, second = self.voters[:2]
+        self.buffer.vote(self.review.pk, first.id, 'upvote')
+
+        with mock.patch.object(vote_buffer, '_write', side_effect=RuntimeError('database down')):
+            with self.assertRaises(RuntimeError):
+                self.buffer.flush()
+        self.assertEqual(self.stored()['counts'], (0, 0))
+
+        # clicked while the failed batch was out, and merged with it
+        self.assertEqual(self.buffer.vote(self.review.pk, second.id, 'downvote'), (1, 1, False, True))
+        self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(self.stored(), {'counts': (1, 1), 'totals': (1, 1), 'upvoters': {first.id}, 'downvoters': {second.id}})
+
+
+class SkillStatsTests(TestCase):
+    """The stats kept up to date by the views should always equal a rebuild from the reviews."""
+
+    def setUp(self):
+        self.users = [User.objects.create_user(f'user{i}', f'user{i}@example.com') for i in range(3)]
+
+    def snapshot(self):
+        stats = {row.user_id: row for row in models.UserSkillStats.objects.all()}
+        # no row is the same as a row of zeroes
+        return {
+            user.id: {field: getattr(stats.get(user.id, models.UserSkillStats()), field) for field in skill_stats.STATS_FIELDS}
+            for user in self.users
+        }
+
+    def assertMatchesRebuild(self):
+        incremental = self.snapshot()
+        skill_stats.rebuild()
+        self.assertEqual(incremental, self.snapshot())
+
+    def client_for(self, user):
+        client = Client()
+        client.force_login(user)
+        return client
+
+    def review(self, from_user, to_user, ratings):
+        response = self.client_for(from_user).post(f'/user/{to_user.username}/', dict(zip(
+            ('review_rating_1', 'review_rating_2', 'review_rating_3'), ratings,
+        )))
+        self.assertEqual(response.status_code, 302)
+        review = models.Review.objects.get(from_user=from_user, to_user=to_user)
+        self.assertEqual(review.ratings(), ratings)
+        return review
+
+    def edit(self, review, ratings):
+        response = self.client_for(review.from_user).post(f'/edit/{review.id}/', {
+            'edit-review': '', **dict(zip(('review_rating_1', 'review_rating_2', 'review_rating_3'), ratings)),
+        })
+        self.assertEqual(response.status_code, 302)
+        review.refresh_from_db()
+        self.assertEqual(review.ratings(), ratings)
+
+    def delete(self, review):
+        response = self.client_for(review.from_user).post(f'/delete/{review.id}/', {'delete-review': ''})
+        self.assertEqual(response.status_code, 302)
+
+    def vote(self, user, review, action):
+        response = self.client_for(user).post('/vote/', {'review_id': review.id, 'action': action})
+        self.assertEqual(response.status_code, 200)
+
+    def test_create_edit_and_delete(self):
+        first, second, third = self.users
+
+        # 0 is the slider's "not rated"
+        review = self.review(first, second, (3, 0, 5))
+        other = self.review(third, second, (1, 2, 2))
+        self.review(second, first, (4, 4, 4))
+        self.assertMatchesRebuild()
+
+        self.edit(review, (5, 1, 5))
+        self.edit(other, (1, 2, 2))
+        self.assertMatchesRebuild()
+
+        self.vote(first, other, 'upvote')
+        self.vote(third, review, 'downvote')
+        self.vote(second, review, 'upvote')
+        self.vote(third, review, 'upvote')
+        self.assertMatchesRebuild()
+
+        self.delete(review)
+        self.assertMatchesRebuild()
+
+        self.delete(other)
+        self.assertMatchesRebuild()
+
+
+class ReviewVisibilityTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user('owner', 'owner@example.com')
+        self.other = User.objects.create_user('other', 'other@example.com')
+        third = User.objects.create_user('third', 'third@example.com')
+        self.reviews = [
+            models.Review.objects.create(to_user=self.owner, from_user=author, communication_bool=public)
+            for author, public in ((self.other, False), (third, True))
+        ]
+        self.foreign = models.Review.objects.create(to_user=self.other, from_user=self.owner)
+
+    def stored(self, review):
+        return models.Review.objects.values(
+            'problem_solving_bool', 'communication_bool', 'sociability_bool', 'version',
+        ).get(pk=review.pk)
+
+    def test_toggles_one_review(self):
+        review = self.reviews[0]
+        toggled = models.Review.toggle_visibility(self.owner, [review.id], ['problem_solving'])
+
+        self.assertEqual(toggled, {review.id: {'problem_solving': True}})
+        self.assertEqual(self.stored(review), {
+            'problem_solving_bool': True, 'communication_bool': False, 'sociability_bool': False, 'version': 1,
+        })
+
+        toggled = models.Review.toggle_visibility(self.owner, [review.id], ['problem_solving'])
+        self.assertEqual(toggled, {review.id: {'problem_solving': False}})
+        self.assertEqual(self.stored(review)['version'], 2)
+
+    def test_toggles_several_reviews_and_skills(self):
+        first, second = self.reviews
+        toggled = models.Review.toggle_visibility(self.owner, [first.id, second.id], ['communication', 'sociability'])
+
+        # each flag flips on its own, so the reviews keep differing
+        self.assertEqual(toggled, {
+            first.id: {'communication': True, 'sociability': True},
+            second.id: {'communication': False, 'sociability': True},
+        })
+        for review, communication in ((first, True), (second, False)):
+            self.assertEqual(self.stored(review), {
+                'problem_solving_bool': False, 'communication_bool': communication, 'sociability_bool': True, 'version': 1,
+            })
+
+    def test_leaves_reviews_of_others_alone(self):
+        own = self.reviews[0]
+        toggled = models.Review.toggle_visibility(self.owner, [own.id, self.foreign.id], ['sociability'])
+
+        self.assertEqual(toggled, {own.id: {'sociability': True}})
+        self.assertEqual(self.stored(self.foreign), {
+            'problem_solving_bool': False, 'communication_bool': False, 'sociability_bool': False, 'version': 0,
+        })
+
+    def test_without_update_returning(self):
+        review = self.reviews[1]
+        with mock.patch.object(connection.features, 'can_return_columns_from_insert', False):
+            toggled = models.Review.toggle_visibility(self.owner, [review.id, self.foreign.id], ['communication'])
+
+        self.assertEqual(toggled, {review.id: {'communication': False}})
+        self.assertEqual(self.stored(review)['version'], 1)
+        self.assertEqual(self.stored(self.foreign)['version'], 0)
+
+    def test_view(self):
+        review = self.reviews[0]
+        self.client.force_login(self.owner)
+
+        def post(review_ids, skills):
+            return self.client.post(
+                '/public_private/', {'review_id': review_ids, 'skill': skills}, HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+            ).json()
+
+        self.assertEqual(post([review.id], ['communication']), {
+            'success': True,
+            'reviews': {str(review.id): {'communication': True}},
+            'skill': 'communication', 'review_id': str(review.id), 'bool_val': True,
+        })
+        self.assertEqual(post([self.foreign.id], ['communication']), {'success': False})
+        self.assertEqual(post([review.id], ['looks']), {'success': False})
+        self.assertEqual(self.stored(self.foreign)['version'], 0)
+
+
+class ReviewPageTests(TestCase):
+    def setUp(self):
+        self.receiver = User.objects.create_user('receiver', 'receiver@example.com')
+        models.UserProfile.objects.create(user=self.receiver, contact_number='9999999999')
+        # the way migration 0016 left existing rows: every review created at the same moment
+        created = timezone.now()
+        self.review_ids = [
+            models.Review.objects.create(
+                to_user=self.receiver, from_user=User.objects.create_user(f'giver{i}', f'giver{i}@example.com'), created=created,
+            ).id
+            for i in range(7)
+        ]
+        models.Review.objects.create(
+            to_user=self.receiver, from_user=User.objects.create_user('latest', 'latest@example.com'),
+            created=created + timedelta(minutes=1),
+        )
+
+    def pages(self, size):
+        reviews = review_cards.review_feed('received', self.receiver, self.receiver)
+        pages, after = [], None
+        while True:
+            cards, after = review_cards.load_review_page(reviews, self.receiver, after=after, size=size)
+            pages.append([card['review'].id for card in cards])
+            if after is None:
+                return pages
+
+    def test_pages_through_equal_created_times(self):
+        latest = models.Review.objects.latest('created').id
+        for size in (1, 3, 4, 8):
+            pages = self.pages(size)
+            ids = [review_id for page in pages for review_id in page]
+            self.assertEqual(ids, [latest, *sorted(self.review_ids, reverse=True)], size)
+            self.assertTrue(all(len(page) == size for page in pages[:-1]), size)
+
+    def test_last_page_has_no_cursor(self):
+        self.assertEqual(len(self.pages(8)), 1)
+        self.assertEqual(self.pages(4)[-1], sorted(self.review_ids, reverse=True)[3:])
+
+    def test_malformed_cursors_are_rejected(self):
+        self.client.force_login(self.receiver)
+        url = '/reviews/receiver/received/'
+        response = self.client.get(url, {'after': ''})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['success'], response.json()['next']), (True, None))
+
+        for cursor in (
+            'junk', '|', 'yesterday|3', f'{timezone.now().isoformat()}|three',
+            '2024-01-01T00:00:00|3',  # no timezone
+            f'{timezone.now().isoformat()}|{2 ** 70}', f'{timezone.now().isoformat()}|-1',
+        ):
+            response = self.client.get(url, {'after': cursor})
+            self.assertEqual(response.status_code, 400, cursor)
+            self.assertEqual(response.json(), {'success': False}, cursor)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'the FTS5 index is SQLite only')
+class UserSearchTests(TestCase):
+    def setUp(self):
+        self.viewer = User.objects.create_user('viewer', 'viewer@example.com', first_name='Vera', last_name='Viewer')
+        self.sean = User.objects.create_user('sean', 'sean@example.com', first_name='Sean', last_name="O'Brien-Smith")
+        self.ann = User.objects.create_user('ann', 'ann@example.com', first_name='Ann', last_name='Seaborne')
+        User.objects.create_superuser('root', 'root@example.com', first_name='Sean', last_name='Root')
+
+    def search(self, query):
+        return [user.username for user in search.search_users(query, self.viewer)[0]]
+
+    def test_uses_the_fts5_index(self):
+        self.assertIsInstance(search.get_backend(), search.FTS5SearchBackend)
+
+    def test_matches_name_prefixes(self):
+        self.assertCountEqual(self.search('sea'), ['sean', 'ann'])
+        self.assertEqual(self.search('sean bri'), ['sean'])
+        self.assertEqual(self.search('sea ann'), ['ann'])
+        # neither the viewer nor superusers
+        self.assertEqual(self.search('vera'), [])
+        self.assertEqual(self.search('root'), [])
+
+    def test_user_input_is_escaped(self):
+        self.assertEqual(self.search("o'brien"), ['sean'])
+        self.assertEqual(self.search('-smith'), ['sean'])
+        for query in ('*', 'sea*', '"', 'o"brien', 'NOT sean', 'sean OR', 'NEAR(', 'first_name:sean', '^', '(', '%', '_', '\\'):
+            self.assertIsInstance(self.search(query), list, query)
+
+    def test_index_follows_saves_and_deletes(self):
+        self.sean.first_name = 'Shaun'
+        self.sean.save()
+        self.assertEqual(self.search('sean'), [])
+        self.assertEqual(self.search('shau'), ['sean'])
+
+        # a save that leaves the names alone doesn't touch the index
+        self.sean.save(update_fields=['last_login'])
+        self.assertEqual(self.search('shau'), ['sean'])
+
+        self.sean.delete()
+        self.assertEqual(self.search('shau'), [])
+
+    def test_falls_back_without_the_index(self):
+        with mock.patch.object(search, '_backends', {}), \
+                mock.patch.object(connection.introspection, 'table_names', return_value=[]):
+            self.assertIs(type(search.get_backend()), search.SearchBackend)
+            self.assertCountEqual(self.search('sea'), ['sean', 'ann'])
+            self.assertEqual(self.search("o'brien"), ['sean'])
+
+    def test_failed_index_setup_is_logged(self):
+        migration = importlib.import_module('main.migrations.0019_user_search_index')
+        schema_editor = mock.Mock(connection=connection, execute=mock.Mock(side_effect=OperationalError('no such module: fts5')))
+
+        with self.assertLogs(migration.logger, 'WARNING') as logs:
+            migration.create_search_index(None, schema_editor)
+        self.assertIn('no such module: fts5', logs.output[0])
+
+
+class PrefixCacheTests(SimpleTestCase):
+    def test_evicts_the_least_recently_used(self):
+        cache = search.PrefixCache(maxsize=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.set('c', 3)
+
+        self.assertEqual(len(cache._entries), 2)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual((cache.get('a'), cache.get('c')), (1, 3))
+
+    def test_entries_expire(self):
+        cache = search.PrefixCache(maxsize=2, ttl=60)
+        with mock.patch('main.search.time.monotonic', return_value=1000):
+            cache.set('a', 1)
+        with mock.patch('main.search.time.monotonic', return_value=1060):
+            self.assertEqual(cache.get('a'), 1)
+        with mock.patch('main.search.time.monotonic', return_value=1061):
+            self.assertIsNone(cache.get('a'))
+        self.assertEqual(len(cache._entries), 0)
+
+
+class SuggestUsersTests(TestCase):
+    def setUp(self):
+        self.addCleanup(search.suggestion_cache.clear)
+        search.suggestion_cache.clear()
+        self.viewer = User.objects.create_user('viewer', 'viewer@example.com', first_name='Vera', last_name='Viewer')
+        self.sean = User.objects.create_user('sean', 'sean@example.com', first_name='Sean', last_name='Smith')
+
+    def suggest(self, prefix):
+        return [suggestion['username'] for suggestion in search.suggest_users(prefix, self.viewer)]
+
+    def test_prefixes_are_cached(self):
+        self.assertEqual(self.suggest('Se'), ['sean'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.suggest(' se '), ['sean'])
+        self.assertEqual(search.suggest_users('se', self.viewer)[0]['url'], '/user/sean/')
+
+    def test_cache_size_is_bounded(self):
+        cache = search.PrefixCache(maxsize=3, ttl=60)
+        with mock.patch.object(search, 'suggestion_cache', cache):
+            for prefix in ('s', 'se', 'sea', 'sean', 'smi'):
+                self.suggest(prefix)
+        self.assertEqual(list(cache._entries), ['sea', 'sean', 'smi'])
+
+    def test_new_users_show_up(self):
+        self.assertEqual(self.suggest('se'), ['sean'])
+        User.objects.create_user('seb', 'seb@example.com', first_name='Sebastian', last_name='Hall')
+        self.assertCountEqual(self.suggest('se'), ['sean', 'seb'])
+
+    def test_renamed_users_move(self):
+        self.assertEqual(self.suggest('se'), ['sean'])
+        self.assertEqual(self.suggest('sh'), [])
+        self.assertEqual(self.suggest('vi'), [])
+
+        form = forms.ProfileDetailsForm({
+            'first_name': 'Shaun', 'last_name': 'Smith', 'contact_number': '0123456789', 'gender': 'M',
+        }, user=self.sean)
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save(self.sean)
+
+        self.assertEqual(self.suggest('se'), [])
+        self.assertEqual(self.suggest('sh'), ['sean'])
+        # prefixes the user is in neither before nor after are kept
+        self.assertIn('vi', search.suggestion_cache._entries)
+
+    def test_deleted_users_go(self):
+        self.assertEqual(self.suggest('se'), ['sean'])
+        self.sean.delete()
+        self.assertEqual(self.suggest('se'), [])
+
+
+@override_settings(SESSION_USER_CACHE_TIMEOUT=60)
+class SessionUserTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create_user('alice', 'alice@example.com', 'old-Passw0rd!')
+        models.UserProfile.objects.create(user=self.user, contact_number='9999999999')
+        self.client.force_login(self.user)
+
+    def cached(self):
+        self.assertEqual(self.client.get('/home/').status_code, 200)
+        return cache.get(session_users._key(self.user.id))
+
+    def test_password_hash_is_not_cached(self):
+        user, _ = self.cached()
+
+        self.assertNotIn(self.user.password.encode(), pickle.dumps(self.cached()))
+        self.assertEqual(user.get_deferred_fields(), {'password'})
+        self.assertEqual(user.userprofile.contact_number, '9999999999')
+        self.assertIs(user.userprofile.user, user)
+
+    def test_session_is_checked_without_the_password(self):
+        self.cached()
+        with self.assertNumQueries(0):
+            user = session_users.get_user(self.user.id)
+            self.assertEqual(user.get_session_auth_hash(), self.user.get_session_auth_hash())
+            self.assertEqual(user.userprofile.contact_number, '9999999999')
+
+        # loaded when asked for
+        self.assertTrue(user.check_password('old-Passw0rd!'))
+
+    def test_password_change_ends_the_other_sessions(self):
+        other = Client()
+        other.force_login(self.user)
+        self.cached()
+
+        response = self.client.post('/password_change/', {
+            'old_password': 'old-Passw0rd!', 'new_password1': 'new-Passw0rd!', 'new_password2': 'new-Passw0rd!',
+        })
+        self.assertRedirects(response, '/home/', fetch_redirect_response=False)
+
+        self.assertEqual(self.client.get('/home/').status_code, 200)
+        self.assertRedirects(other.get('/home/'), '/?next=/home/', fetch_redirect_response=False)
+
+
+class FirstRequestTimingTests(TestCase):
+    def test_only_the_first_request_is_logged(self):
+        client = Client()
+        with self.assertLogs('main.middleware', 'INFO') as logs:
+            client.get('/signup/')
+            client.get('/signup/')
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('Served the first request (GET /signup/) in', logs.output[0])
+
+    async def test_async_first_request_is_logged(self):
+        client = AsyncClient()
+        with self.assertLogs('main.middleware', 'INFO') as logs:
+            await client.get('/signup/')
+            await client.get('/signup/')
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('Served the first request (GET /signup/) in', logs.output[0])
+
+
+class RatingAccumulatorTests(SimpleTestCase):
+    def test_totals_per_user_across_chunks(self):
+        accumulator = review_analytics.RatingAccumulator()
+        # user id, upvotes, downvotes, ratings
+        accumulator.add(np.array([
+            [10 ** 12, 0, 0, 5, 3, 0],
+            [7, 1, 1, 4, 7, -1],
+        ]))
+        accumulator.add(np.array([
+            [3, 0, 0, 1, 2, 3],
+            [7, 0, 0, 2, 2, 2],
+        ]))
+
+        self.assertEqual(accumulator.user_ids.tolist(), [3, 7, 10 ** 12])
+        self.assertEqual(accumulator.reviews.tolist(), [1, 2, 1])
+        self.assertEqual(accumulator.rated.tolist(), [[1, 2, 1], [1, 1, 1], [1, 1, 0]])
+        np.testing.assert_allclose(accumulator.means(), [[1, 3, 5], [2, 2, 3], [3, 2, np.nan]])
+        # the first review by user 7 weighs 2/3, the second 1
+        np.testing.assert_allclose(accumulator.weighted_means()[0], [1, (2 / 3 * 4 + 2) / (2 / 3 + 1), 5])
+
+        # the 7 and the -1 are unrated, not clipped to 5 and 0
+        self.assertEqual(accumulator.histograms.tolist(), [
+            [0, 1, 1, 0, 1, 1],
+            [1, 0, 2, 1, 0, 0],
+            [2, 0, 1, 1, 0, 0],
+        ])
+        self.assertEqual(accumulator.complete, 2)
@@ -0,0 +1,151 @@
+import io
+import uuid
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.utils.module_loading import import_string
+from PIL import Image, ImageOps
+
+# square edge in pixels of each variant, about twice the slot it is shown in
+VARIANTS = {
+    'avatar': 200,
+    'card': 800,
+    'full': 1600,
+}
+
+# Pillow format and encoder options; the files are saved without EXIF or ICC data
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+
+
+@lru_cache(maxsize=None)
+def storage():
+    """
+    The storage profile images and their variants live in: the
+    PROFILE_IMAGE_STORAGE backend, with identical files stored once.
+    """
+    from .storage import ContentAddressedStorage
+
+    return ContentAddressedStorage(import_string(settings.PROFILE_IMAGE_STORAGE)())
+
+
+def _decode(file):
+    image = Image.open(file)
+    # lets JPEGs decode straight at a reduced scale when they're far larger than needed
+    image.draft('RGB', (VARIANTS['full'], VARIANTS['full']))
+    image = ImageOps.exif_transpose(image)
+
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def render(file):
+    """
+    Decodes the image in `file` once and returns its variants as
+    {variant: {format: bytes}}: square crops, never upscaled, without metadata.
+    """
+    image = _decode(file)
+    edge = min(VARIANTS['full'], *image.size)
+    image = ImageOps.fit(image, (edge, edge), Image.LANCZOS)
+
+    rendered = {}
+    # largest first, so each variant is scaled down from the previous one
+    for variant, size in sorted(VARIANTS.items(), key=lambda item: -item[1]):
+        size = min(size, edge)
+        if image.width != size:
+            image = image.resize((size, size), Image.LANCZOS)
+
+        rendered[variant] = {}
+        for extension, (pil_format, options) in FORMATS.items():
+            buffer = io.BytesIO()
+            image.save(buffer, pil_format, **options)
+            rendered[variant][extension] = buffer.getvalue()
+    return rendered
+
+
+def original_name(image):
+    """The storage name of a profile_image, whether a file or a Cloudinary resource."""
+    if hasattr(image, 'public_id'):
+        return f'{image.public_id}.{image.format}' if image.format else image.public_id
+    return image.name
+
+
+def store(user_id, rendered):
+    """
+    Saves rendered variants to the storage and returns their names by variant
+    and format. Should one fail, those already saved are released again.
+    """
+    token = uuid.uuid4().hex[:12]
+    names = {}
+    try:
+        for variant, files in rendered.items():
+            names[variant] = {}
+            for extension, data in files.items():
+                name = f'profile_images/variants/{user_id}/{token}-{variant}.{extension}'
+                names[variant][extension] = storage().save(name, ContentFile(data))
+    except Exception:
+        discard(names)
+        raise
+    return names
+
+
+def discard(variants):
+    for files in variants.values():
+        for name in files.values():
+            storage().delete(name)
+
+
+def generate(profile, file=None):
+    """
+    Renders and stores the variants of the profile's image, from `file` when
+    the upload is at hand, records them on the profile and drops the previous
+    ones. A profile without an image is left with none.
+    """
+    old = profile.image_variants or {}
+    if profile.profile_image:
+        source = file or storage().open(original_name(profile.profile_image))
+        source.seek(0)
+        profile.image_variants = store(profile.user_id, render(source))
+    else:
+        profile.image_variants = {}
+
+    try:
+        profile.save(update_fields=['image_variants'])
+    except Exception:
+        discard(profile.image_variants)
+        raise
+    discard(old)
+
+
+def urls(profile):
+    """
+    Returns {variant: {'webp': url, 'src': url}} for the profile's image,
+    'webp' being absent when there is no WebP copy, or {} without an image.
+    """
+    image = profile.profile_image
+    if not image:
+        return {}
+
+    if profile.image_variants:
+        return {
+            variant: {'webp': storage().url(files['webp']), 'src': storage().url(files['jpeg'])}
+            for variant, files in profile.image_variants.items()
+        }
+
+    if hasattr(image, 'build_url'):
+        # not generated yet: let Cloudinary derive the same sizes from the original
+        return {
+            variant: {
+                'webp': image.build_url(width=size, height=size, crop='fill', format='webp', secure=True),
+                'src': image.build_url(width=size, height=size, crop='fill', format='jpg', secure=True),
+            }
+            for variant, size in VARIANTS.items()
+        }
+    return {variant: {'src': image.url} for variant in VARIANTS}
@@ -23,5 +23,7 @@ urlpatterns = [
     # views for AJAX requests
     path('vote/', views.vote_view, name='vote'),
     path('public_private/', views.public_private_view, name='public_private'),
+    path('reviews/<str:username>/<str:section>/', views.reviews_page_view, name='reviews_page'),
+    path('search/suggest/', views.search_suggest_view, name='search_suggest'),
 
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
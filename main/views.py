@@ -1,16 +1,25 @@
 from django.shortcuts import render, redirect, HttpResponseRedirect
 from django.http import HttpResponse, JsonResponse
-from django.contrib.auth import update_session_auth_hash, authenticate, login, logout
+from django.contrib.auth import update_session_auth_hash, login, logout
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.decorators import login_required
 from django.utils import timezone
-from django.db.models import Q
+from django.utils.crypto import constant_time_compare
 from django.contrib.auth.models import User
 from django.core.exceptions import ObjectDoesNotExist
 from django.views.decorators.cache import cache_control
+from django.template.loader import render_to_string
+from django.db import transaction
+from asgiref.sync import sync_to_async
 
 from . import forms
+from . import profile_headers
+from .decorators import async_login_required
 from . import models
-from . import review_criteria
+from . import review_cards
+from . import search
+from . import skill_stats
+from . import vote_buffer
 
 @cache_control(no_cache=True, must_revalidate=True, no_store=True)
 def login_view(request):
@@ -20,14 +29,8 @@ def login_view(request):
     if request.method == 'POST':
         form = forms.CustomAuthenticationForm(request.POST)
         if form.is_valid():
-            email = form.cleaned_data['email']
-            password = form.cleaned_data['password']
-
-            user = authenticate(request, email=email, password=password)
-            
-            if user is not None:
-                login(request, user, backend='main.backends.EmailBackend')
-                return redirect('main:home')
+            login(request, form.get_user(), backend='main.backends.EmailBackend')
+            return redirect('main:home')
     else:
         form = forms.CustomAuthenticationForm()
 
@@ -46,8 +49,8 @@ def signup_view(request):
                 'last_name': form.cleaned_data['last_name'],
                 'email': form.cleaned_data['email'],
                 'contact_number': form.cleaned_data['contact_number'],
-                'password1': form.cleaned_data['password1'],
-                'password2': form.cleaned_data['password2'],
+                # hashed, as the session may be a cookie
+                'password': make_password(form.cleaned_data['password1']),
             }
             request.session['user_data'] = user_data
             form.send_otp_email(request)
@@ -70,22 +73,22 @@ def verify_view(request):
         form = forms.OTPVerificationForm(request.POST)
         if form.is_valid():
             otp = form.cleaned_data['otp']
-            if str(request.session.get('otp')) == str(otp):
+            if constant_time_compare(request.session.get('otp', ''), forms.otp_digest(otp)):
                 contact_number = user_data['contact_number']
+                password = user_data['password']
 
-                user_data['password'] = user_data['password1']
+                user_data['password'] = None
                 user_data['username']=str(user_data['first_name']+'-'+user_data['last_name']+'-'+timezone.now().strftime('%Y%m%d%H%M%S')).lower()
-                del user_data['password1']
-                del user_data['password2']
                 del user_data['contact_number']
 
                 user = User.objects.create_user(**user_data)
                 user_profile = models.UserProfile.objects.create(user=user, contact_number=contact_number)
 
-                user.save()
+                user.password = password
+                user.save(update_fields=['password'])
 
                 del request.session['user_data']
-                login(request, user, backend='django.contrib.auth.backends.ModelBackend')
+                login(request, user, backend='main.backends.EmailBackend')
                 return redirect('main:home')
             else:
                 form.add_error('otp', 'Wrong OTP!')
@@ -98,66 +101,69 @@ def verify_view(request):
 @login_required
 def home_view(request):
     user = request.user
-    reviews = models.Review.objects.all()
-    rec_reviews = reviews.filter(to_user=user.username)
-    giv_reviews = reviews.filter(from_user=user.username)
-
-    processed_giv_reviews = []
-    for review in giv_reviews:
-        processed_giv_reviews.append({
-            'review': review,
-            'has_upvoted': review.has_upvoted(user),
-            'has_downvoted': review.has_downvoted(user), 
-        })
-
-    processed_rec_reviews = []
-    for review in rec_reviews:
-        processed_rec_reviews.append({
-            'review': review,
-            'has_upvoted': review.has_upvoted(user),
-            'has_downvoted': review.has_downvoted(user), 
-        })
+
+    processed_rec_reviews, rec_next = review_cards.load_review_page(review_cards.review_feed('received', user, user), user)
+    processed_giv_reviews, giv_next = review_cards.load_review_page(review_cards.review_feed('given', user, user), user)
 
     return render(request, 'main/home.html',
         {
             'user': user,
-            'reviews':reviews,
-            'rec_reviews': rec_reviews,
-            'giv_reviews': giv_reviews,
-            'processed_rec_reviews':processed_rec_reviews,
-            'processed_giv_reviews':processed_giv_reviews,
-
-            'problem_solving': review_criteria.problem_solving,
-            'communication': review_criteria.communication,
-            'sociability': review_criteria.sociability,
+            'own_profile': True,
+            'processed_rec_reviews': processed_rec_reviews,
+            'processed_giv_reviews': processed_giv_reviews,
+            'rec_next': rec_next,
+            'giv_next': giv_next,
+            'skill_stats': models.UserSkillStats.objects.filter(user=user).first(),
+            'header': profile_headers.get_header(user=user),
         }
     )
 
 
-@login_required
-def vote_view(request):
+@async_login_required
+async def vote_view(request):
     user = request.user
 
-    if request.method == 'POST':
-        if 'action' in request.POST:
-            review_id = request.POST.get('review_id')
-            action = request.POST.get('action')
-            review = models.Review.objects.get(id=review_id)
-
-            if action == 'upvote':
-                review.upvote(user)
-            elif action == 'downvote':
-                review.downvote(user)
-            review.save()
-
-            response_data = {
+    if request.method == 'POST' and 'action' in request.POST:
+        review_id = request.POST.get('review_id')
+        action = request.POST.get('action')
+
+        if action in ('upvote', 'downvote') and vote_buffer.enabled():
+            try:
+                upvotes_count, downvotes_count, has_upvoted, has_downvoted = await sync_to_async(vote_buffer.buffer.vote)(review_id, user.pk, action)
+            except (ObjectDoesNotExist, ValueError):
+                return JsonResponse({ 'success':False, })
+
+            return JsonResponse({
                 'success':True,
                 'review_id': review_id,
-                'upvotes_count': review.get_upvotes_count(),
-                'downvotes_count': review.get_downvotes_count(),
-                'has_upvoted': review.has_upvoted(user),
-                'has_downvoted': review.has_downvoted(user),
-            }
+                'upvotes_count': upvotes_count,
+                'downvotes_count': downvotes_count,
+                'has_upvoted': has_upvoted,
+                'has_downvoted': has_downvoted,
+            })
+
+        try:
+            review = await models.Review.objects.only('id', 'to_user_id', *models.Review.COUNTER_FIELDS).aget(id=review_id)
+        except (ObjectDoesNotExist, ValueError):
+            return JsonResponse({ 'success':False, })
+
+        # the toggle is a transaction, which the async ORM cannot open itself
+        if action == 'upvote':
+            has_upvoted, has_downvoted = await sync_to_async(review.upvote)(user)
+        elif action == 'downvote':
+            has_upvoted, has_downvoted = await sync_to_async(review.downvote)(user)
+        else:
+            has_upvoted = await review.upvotes.filter(pk=user.pk).aexists()
+            has_downvoted = await review.downvotes.filter(pk=user.pk).aexists()
+
+        response_data = {
+            'success':True,
+            'review_id': review_id,
+            'upvotes_count': review.upvotes_count,
+            'downvotes_count': review.downvotes_count,
+            'has_upvoted': has_upvoted,
+            'has_downvoted': has_downvoted,
+        }
 
         return JsonResponse(response_data)
     
@@ -237,80 +243,56 @@ def user_view(request, username):
         return redirect('main:home')
     
     else:
-        user = User.objects.get(username=username)
-        reviews = models.Review.objects.all()
-        rec_reviews = reviews.filter(to_user=username)
-        giv_reviews = reviews.filter(anonymous_from=username)
-        
-        current_user = request.user
-
-        curr_user_rec_review = rec_reviews.filter(from_user=current_user).first()
-        curr_user_giv_review = giv_reviews.filter(to_user=current_user).first()
-        rec_reviews = rec_reviews.exclude(from_user=current_user)
-        giv_reviews = giv_reviews.exclude(to_user=current_user)
-
-        processed_giv_reviews = []
-        if curr_user_giv_review is not None:
-            processed_giv_reviews.append({
-                'review': curr_user_giv_review,
-                'has_upvoted': curr_user_giv_review.has_upvoted(current_user),
-                'has_downvoted': curr_user_giv_review.has_downvoted(current_user),
-            })
-        for review in giv_reviews:
-            processed_giv_reviews.append({
-                'review': review,
-                'has_upvoted': review.has_upvoted(current_user),
-                'has_downvoted': review.has_downvoted(current_user), 
-            })
+        header = profile_headers.get_header(username=username)
+        if header is None:
+            return redirect('main:home')
 
-        processed_rec_reviews = []
-        if curr_user_rec_review is not None:
-            processed_rec_reviews.append({
-                'review': curr_user_rec_review,
-                'has_upvoted': curr_user_rec_review.has_upvoted(current_user),
-                'has_downvoted': curr_user_rec_review.has_downvoted(current_user),
-            })
-        for review in rec_reviews:
-            processed_rec_reviews.append({
-                'review': review,
-                'has_upvoted': review.has_upvoted(current_user),
-                'has_downvoted': review.has_downvoted(current_user), 
-            })
+        user = profile_headers.header_user(header)
+        current_user = request.user
 
-        existing_review = reviews.filter(to_user=username, from_user=request.user.username).first()
+        existing_review = models.Review.objects.filter(to_user=user, from_user=current_user).first()
 
         if request.method == 'POST':
             if 'action' not in request.POST:
+                # read before the form writes the posted ratings onto the instance
+                old_ratings = existing_review.ratings() if existing_review else None
                 reviewform = forms.ReviewForm(request.POST, instance=existing_review)
                 if reviewform.is_valid():
-                    review = reviewform.save(commit=False)
-                    review.to_user = username
-                    if reviewform.cleaned_data['is_anonymous']:
-                        review.anonymous_from = 'Anonymous'
-                    else:
-                        review.anonymous_from = request.user.username
-                    review.from_user = request.user.username
-                    review.save()
+                    review = reviewform.instance
+                    review.to_user = user
+                    review.from_user = current_user
+                    with transaction.atomic():
+                        reviewform.save()
+                        if old_ratings != review.ratings():
+                            skill_stats.record_review(user.id, old_ratings, review.ratings())
                     return redirect('main:user', username=username)
                 else:
                     reviewform = forms.ReviewForm(instance=existing_review)
         else:
             reviewform = forms.ReviewForm(instance=existing_review)
 
+        # the current user's own review (given or received) is pinned above the feeds
+        pinned_rec_reviews = review_cards.load_review_cards(
+            models.Review.objects.filter(to_user=user, from_user=current_user), current_user
+        )
+        pinned_giv_reviews = review_cards.load_review_cards(
+            models.Review.objects.filter(to_user=current_user, from_user=user, is_anonymous=False), current_user
+        )
+        processed_rec_reviews, rec_next = review_cards.load_review_page(review_cards.review_feed('received', user, current_user), current_user)
+        processed_giv_reviews, giv_next = review_cards.load_review_page(review_cards.review_feed('given', user, current_user), current_user)
+
         return render(request, 'main/user.html',
             {
                 'user':user,
+                'own_profile':False,
                 'reviewform':reviewform if not existing_review else None,
-                'reviews':reviews,
-                'rec_reviews':rec_reviews,
-                'giv_reviews':giv_reviews,
-                'processed_rec_reviews':processed_rec_reviews,
-                'processed_giv_reviews':processed_giv_reviews,
+                'processed_rec_reviews':pinned_rec_reviews + processed_rec_reviews,
+                'processed_giv_reviews':pinned_giv_reviews + processed_giv_reviews,
+                'rec_next':rec_next,
+                'giv_next':giv_next,
                 'existing_review':existing_review,
-
-                'problem_solving': review_criteria.problem_solving,
-                'communication': review_criteria.communication,
-                'sociability': review_criteria.sociability,
+                'skill_stats':models.UserSkillStats.objects.filter(user=user).first(),
+                'header':header,
             }
         )
 
@@ -322,52 +304,42 @@ def search_view(request):
     if not query:
         return HttpResponseRedirect(request.META.get('HTTP_REFERER'))
 
-    if len(query.split()) > 1:
-        first = query.split()[0]
-        second = query.split()[1]
-        users = User.objects.filter(
-            first_name__icontains=first,
-            last_name__icontains=second
-        ).exclude(username=request.user.username).exclude(is_superuser=True)
-    else:
-        first = query.split()[0]
-        users = User.objects.filter(
-            Q(first_name__icontains=first) | Q(last_name__icontains=first)
-        ).exclude(username=request.user.username).exclude(is_superuser=True)
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+
+    users, has_next = search.search_users(query, request.user, page=page)
 
-    return render(request, 'main/search.html', { 'users': users, 'query': query, })
+    return render(request, 'main/search.html', { 'users': users, 'query': query, 'page': page, 'has_next': has_next, })
 
 
 @login_required
 def edit_view(request, review_id):
     try:
-        review = models.Review.objects.get(id=review_id)
+        review = models.Review.objects.select_related('to_user').get(id=review_id)
     except ObjectDoesNotExist:
         return redirect('main:home')
     
-    if str(request.user.username) == str(review.from_user):
+    if request.user.id == review.from_user_id:
         if request.method == 'POST':
             
             if 'edit-review' in request.POST:
+                old_ratings = review.ratings()
                 form = forms.ReviewForm(request.POST, instance=review)
                 
                 if form.is_valid():
-                    updated_review = form.save(commit=False)
-                    if form.cleaned_data['is_anonymous']:
-                        updated_review.anonymous_from = 'Anonymous'
-                    else:
-                        updated_review.anonymous_from = request.user.username
-                    updated_review.save()
-                    return redirect('main:user', username=str(review.to_user))
+                    with transaction.atomic():
+                        form.save()
+                        if old_ratings != review.ratings():
+                            skill_stats.record_review(review.to_user_id, old_ratings, review.ratings())
+                    return redirect('main:user', username=review.to_user.username)
             
             else:
                 form = forms.ReviewForm(instance=review)
                 return render(request, 'main/edit.html',
                     {
-                        'form':form, 'review_id':review_id, 'review':review, 'username':review.to_user, 
-                        'problem_solving': review_criteria.problem_solving,
-                        'communication': review_criteria.communication,
-                        'sociability': review_criteria.sociability,
+                        'form':form, 'review_id':review_id, 'review':review, 'username':review.to_user.username, 
                     }
                 )
             
@@ -375,32 +347,31 @@ def edit_view(request, review_id):
             form = forms.ReviewForm(instance=review)
             return render(request, 'main/edit.html', 
                 {
-                    'form':form, 'review_id':review_id, 'review':review, 'username':review.to_user, 
-                    'problem_solving': review_criteria.problem_solving,
-                    'communication': review_criteria.communication,
-                    'sociability': review_criteria.sociability,
+                    'form':form, 'review_id':review_id, 'review':review, 'username':review.to_user.username, 
                 }
             )
         
-    return redirect('main:user', username=str(review.to_user))
+    return redirect('main:user', username=review.to_user.username)
 
 
 @login_required
 def delete_view(request, review_id):
-    review = models.Review.objects.get(id=review_id)
+    review = models.Review.objects.select_related('to_user').get(id=review_id)
 
-    if str(request.user) == str(review.from_user):
+    if request.user.id == review.from_user_id:
         if request.method == 'POST':
             if 'delete-review' in request.POST:
-                review.delete()
-                return redirect('main:user', username=str(review.to_user))
+                with transaction.atomic():
+                    review.delete()
+                    skill_stats.review_deleted(review)
+                return redirect('main:user', username=review.to_user.username)
             else:
-                return render(request, 'main/delete.html', { 'review_id':review_id, 'username':review.to_user, })
+                return render(request, 'main/delete.html', { 'review_id':review_id, 'username':review.to_user.username, })
 
         else:
-            return render(request, 'main/delete.html', { 'review_id':review_id, 'username':review.to_user, })
+            return render(request, 'main/delete.html', { 'review_id':review_id, 'username':review.to_user.username, })
     
-    return redirect('main:user', username=str(review.to_user))
+    return redirect('main:user', username=review.to_user.username)
 
 
 @login_required
@@ -422,27 +393,65 @@ def password_change_view(request):
 def is_ajax(request):
     return request.META.get('HTTP_X_REQUESTED_WITH') == 'XMLHttpRequest'
 
-@login_required
-def public_private_view(request):
+@async_login_required
+async def public_private_view(request):
+    # several review_id/skill values toggle every listed skill on every listed review
     if request.method == 'POST' and is_ajax(request):
-        review_id = request.POST.get('review_id')
-        skill = request.POST.get('skill')
-
-        bool_val = False
-
-        review = models.Review.objects.get(id=review_id)
-        if skill == 'problem_solving':
-            review.problem_solving_bool = not review.problem_solving_bool
-            bool_val = review.problem_solving_bool
-        elif skill == 'communication':
-            review.communication_bool = not review.communication_bool
-            bool_val = review.communication_bool
-        elif skill == 'sociability':
-            review.sociability_bool = not review.sociability_bool
-            bool_val = review.sociability_bool
-
-        review.save()
+        review_ids = request.POST.getlist('review_id')
+        skills = list(dict.fromkeys(request.POST.getlist('skill')))
+
+        try:
+            ids = [int(review_id) for review_id in review_ids]
+        except ValueError:
+            return JsonResponse({ 'success':False, }, safe=False)
+
+        if not ids or not skills or any(skill not in models.Review.VISIBILITY_FIELDS for skill in skills):
+            return JsonResponse({ 'success':False, }, safe=False)
+
+        toggled = await sync_to_async(models.Review.toggle_visibility)(request.user, ids, skills)
+        if not toggled:
+            return JsonResponse({ 'success':False, }, safe=False)
+
+        response_data = { 'success':True, 'reviews':{ str(review_id):flags for review_id, flags in toggled.items() }, }
+        if len(review_ids) == 1 and len(skills) == 1:
+            response_data.update({ 'skill':skills[0], 'review_id':review_ids[0], 'bool_val':toggled[ids[0]][skills[0]], })
         
-        return JsonResponse({ 'success':True, 'skill':skill, 'review_id':review_id, 'bool_val':bool_val, }, safe=False)
+        return JsonResponse(response_data, safe=False)
     
     return JsonResponse({ 'success':False, }, safe=False)
+
+
+@login_required
+def reviews_page_view(request, username, section):
+    if section not in ('received', 'given'):
+        return JsonResponse({ 'success':False, })
+
+    header = profile_headers.get_header(username=username)
+    if header is None:
+        return JsonResponse({ 'success':False, })
+
+    try:
+        user = profile_headers.header_user(header)
+        reviews = review_cards.review_feed(section, user, request.user)
+        processed_reviews, next_cursor = review_cards.load_review_page(reviews, request.user, after=request.GET.get('after'))
+    except ValueError:
+        # a malformed cursor
+        return JsonResponse({ 'success':False, }, status=400)
+
+    html = render_to_string('main/review_card_list.html',
+        {
+            'reviews': processed_reviews,
+            'section': section,
+            'own_profile': user == request.user,
+            'user': user,
+        },
+        request=request,
+    )
+
+    return JsonResponse({ 'success':True, 'html':html, 'next':next_cursor, })
+
+
+@login_required
+def search_suggest_view(request):
+    prefix = request.GET.get('q', '')
+    return JsonResponse({ 'success':True, 'users':search.suggest_users(prefix, request.user), })
@@ -0,0 +1,240 @@
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connections, transaction
+from django.db.models import Exists, F, OuterRef
+
+from . import models
+
+logger = logging.getLogger(__name__)
+
+UP = 1
+NONE = 0
+DOWN = -1
+
+# flush deletes/inserts in chunks so the generated SQL stays bounded
+CHUNK_SIZE = 500
+
+
+def enabled():
+    return getattr(settings, 'VOTE_BUFFER', False)
+
+
+def _counts(state):
+    return int(state == UP), int(state == DOWN)
+
+
+class VoteBuffer:
+    """
+    Collects vote clicks in memory and writes them to the vote tables and
+    counters in one transaction every `interval` seconds, so a burst of
+    clicks on a popular review costs one counter update per flush instead of
+    a locked read-modify-write per click.
+
+    Each (review, user) pair keeps only its latest intended state, together
+    with the state the database held when the pair was first buffered, which
+    is what the pending counter deltas are measured against. The buffer is
+    per process: other workers see the votes once they are flushed, and
+    votes still buffered when a process is killed outright are lost.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._pending = defaultdict(dict)  # review id -> {user id: (stored state, state)}
+        self._deltas = defaultdict(lambda: [0, 0])  # review id -> [upvotes, downvotes]
+        # the batch being written, which reads treat as already stored
+        self._flushing = {}
+        self._flushing_deltas = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+
+    def vote(self, review_id, user_id, action):
+        """
+        Buffers `user_id` toggling `action` ('upvote' or 'downvote') on the
+        review and returns its merged (upvotes_count, downvotes_count,
+        has_upvoted, has_downvoted). Costs one read query and no writes.
+        Raises Review.DoesNotExist for an unknown review.
+        """
+        row = models.Review.objects.filter(pk=review_id).annotate(
+            stored_up=Exists(models.Review.upvotes.through.objects.filter(review=OuterRef('pk'), user=user_id)),
+            stored_down=Exists(models.Review.downvotes.through.objects.filter(review=OuterRef('pk'), user=user_id)),
+        ).values('id', 'upvotes_count', 'downvotes_count', 'stored_up', 'stored_down').get()
+        review_id = row['id']
+        target = UP if action == 'upvote' else DOWN
+
+        with self._lock:
+            entry = self._pending[review_id].get(user_id)
+            if entry is None:
+                flushing = self._flushing.get(review_id, {}).get(user_id)
+                stored = flushing[1] if flushing else UP if row['stored_up'] else DOWN if row['stored_down'] else NONE
+                entry = (stored, stored)
+            stored, current = entry
+            state = NONE if current == target else target
+            self._pending[review_id][user_id] = (stored, state)
+
+            deltas = self._deltas[review_id]
+            for index, (before, after) in enumerate(zip(_counts(current), _counts(state))):
+                deltas[index] += after - before
+            upvotes_delta, downvotes_delta = self._merged_deltas(review_id)
+
+        self._start()
+        return row['upvotes_count'] + upvotes_delta, row['downvotes_count'] + downvotes_delta, state == UP, state == DOWN
+
+    def merge(self, card, viewer_id):
+        """Overlays the buffered votes onto a card built from the database."""
+        review_id = card['review'].id
+        with self._lock:
+            if review_id not in self._pending and review_id not in self._flushing:
+                return card
+            upvotes_delta, downvotes_delta = self._merged_deltas(review_id)
+            entry = self._pending.get(review_id, {}).get(viewer_id) or self._flushing.get(review_id, {}).get(viewer_id)
+
+        card['upvotes_count'] += upvotes_delta
+        card['downvotes_count'] += downvotes_delta
+        if entry is not None:
+            card['has_upvoted'], card['has_downvoted'] = entry[1] == UP, entry[1] == DOWN
+        return card
+
+    def _merged_deltas(self, review_id):
+        deltas = self._deltas.get(review_id, (0, 0))
+        flushing = self._flushing_deltas.get(review_id, (0, 0))
+        return deltas[0] + flushing[0], deltas[1] + flushing[1]
+
+    def flush(self):
+        """Writes every buffered vote in one transaction and returns how many pairs were flushed."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, defaultdict(dict)
+                self._flushing, self._flushing_deltas = pending, self._deltas
+                self._deltas = defaultdict(lambda: [0, 0])
+
+            if not pending:
+                return 0
+
+            try:
+                _write(pending)
+            except Exception:
+                self._restore(pending)
+                raise
+            finally:
+                with self._lock:
+                    self._flushing, self._flushing_deltas = {}, {}
+
+            return sum(len(users) for users in pending.values())
+
+    def _restore(self, pending):
+        # put a failed batch back under anything buffered since it was taken
+        with self._lock:
+            for review_id, users in pending.items():
+                for user_id, (stored, state) in users.items():
+                    newer = self._pending[review_id].get(user_id)
+                    self._pending[review_id][user_id] = (stored, newer[1] if newer else state)
+
+                deltas = [0, 0]
+                for stored, state in self._pending[review_id].values():
+                    for index, (before, after) in enumerate(zip(_counts(stored), _counts(state))):
+                        deltas[index] += after - before
+                self._deltas[review_id] = deltas
+
+    def _start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='vote-buffer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Flushing buffered votes failed; retrying next interval.')
+            finally:
+                connections.close_all()
+
+
+def _chunks(items):
+    for start in range(0, len(items), CHUNK_SIZE):
+        yield items[start:start + CHUNK_SIZE]
+
+
+def _write(pending):
+    """
+    Brings the vote tables in line with the buffered states. The current rows
+    are read back inside the transaction, so the counters move by what really
+    changed even if another process wrote the same pairs meanwhile.
+    """
+    upvotes = models.Review.upvotes.through
+    downvotes = models.Review.downvotes.through
+
+    with transaction.atomic():
+        # votes on reviews or by users deleted since they were buffered are dropped
+        receivers = dict(models.Review.objects.filter(pk__in=list(pending)).values_list('id', 'to_user_id'))
+        voter_ids = list({user_id for users in pending.values() for user_id in users})
+        voters = set()
+        for user_ids in _chunks(voter_ids):
+            voters.update(User.objects.filter(pk__in=user_ids).values_list('id', flat=True))
+        pending = {
+            review_id: {user_id: entry for user_id, entry in users.items() if user_id in voters}
+            for review_id, users in pending.items() if review_id in receivers
+        }
+
+        current = {}
+        for review_id, users in pending.items():
+            for user_ids in _chunks(list(users)):
+                for through, state in ((upvotes, UP), (downvotes, DOWN)):
+                    for user_id in through.objects.filter(review_id=review_id, user_id__in=user_ids).values_list('user_id', flat=True):
+                        current[review_id, user_id] = state
+
+        removals = {UP: defaultdict(list), DOWN: defaultdict(list)}
+        additions = {UP: [], DOWN: []}
+        deltas = defaultdict(lambda: [0, 0])
+        for review_id, users in pending.items():
+            for user_id, (_, state) in users.items():
+                before = current.get((review_id, user_id), NONE)
+                if before == state:
+                    continue
+                if before != NONE:
+                    removals[before][review_id].append(user_id)
+                if state != NONE:
+                    additions[state].append((review_id, user_id))
+                for index, (old, new) in enumerate(zip(_counts(before), _counts(state))):
+                    deltas[review_id][index] += new - old
+
+        for state, through in ((UP, upvotes), (DOWN, downvotes)):
+            for review_id, users in removals[state].items():
+                for user_ids in _chunks(users):
+                    through.objects.filter(review_id=review_id, user_id__in=user_ids).delete()
+            through.objects.bulk_create(
+                [through(review_id=review_id, user_id=user_id) for review_id, user_id in additions[state]],
+                batch_size=CHUNK_SIZE, ignore_conflicts=True,
+            )
+
+        user_deltas = defaultdict(lambda: [0, 0])
+        for review_id, (upvotes_delta, downvotes_delta) in deltas.items():
+            if not upvotes_delta and not downvotes_delta:
+                continue
+            models.Review.objects.filter(pk=review_id).update(
+                upvotes_count=F('upvotes_count') + upvotes_delta,
+                downvotes_count=F('downvotes_count') + downvotes_delta,
+            )
+            user_deltas[receivers[review_id]][0] += upvotes_delta
+            user_deltas[receivers[review_id]][1] += downvotes_delta
+
+        for user_id, (upvotes_delta, downvotes_delta) in user_deltas.items():
+            models.UserSkillStats.objects.filter(user_id=user_id).update(
+                upvotes_total=F('upvotes_total') + upvotes_delta,
+                downvotes_total=F('downvotes_total') + downvotes_delta,
+            )
+
+
+buffer = VoteBuffer(getattr(settings, 'VOTE_BUFFER_INTERVAL', 1.0))
+atexit.register(lambda: enabled() and buffer.flush())
@@ -0,0 +1,45 @@
+import logging
+import os
+import time
+
+from django.apps import apps
+from django.template import engines
+
+logger = logging.getLogger(__name__)
+
+# the apps whose templates are compiled ahead of the first request
+APPS = ('main', 'password_reset')
+
+
+def template_names():
+    """The names of every template in the APPS' templates directories."""
+    names = []
+    for label in APPS:
+        root = os.path.join(apps.get_app_config(label).path, 'templates')
+        for directory, _, files in os.walk(root):
+            for file in files:
+                if file.endswith(('.html', '.txt')):
+                    names.append(os.path.relpath(os.path.join(directory, file), root).replace(os.sep, '/'))
+    return sorted(names)
+
+
+def warm_templates():
+    """
+    Loads and compiles every template of the APPS through each Django
+    template engine, so that with the cached loader a fresh worker's first
+    requests find them compiled. Returns (templates, seconds).
+    """
+    names = template_names()
+    start = time.perf_counter()
+    for engine in engines.all():
+        if not hasattr(engine, 'engine'):
+            continue
+        for name in names:
+            try:
+                engine.get_template(name)
+            except Exception:
+                logger.exception('Could not compile template %s while warming up.', name)
+    elapsed = time.perf_counter() - start
+
+    logger.info('Compiled %d templates in %.1f ms.', len(names), elapsed * 1000)
+    return len(names), elapsed
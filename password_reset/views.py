@@ -1,7 +1,6 @@
 from django.shortcuts import render, redirect
 
 from django.contrib.auth.tokens import default_token_generator
-from django.core.mail import EmailMessage
 from django.contrib.auth.models import User
 from django.urls import reverse_lazy
 from django.contrib.sites.shortcuts import get_current_site
@@ -11,6 +10,7 @@ from django.utils.encoding import force_bytes, force_str
 from django.contrib.auth import login as login, logout
 
 from . import forms
+from main import outbox
 from django.conf import settings
 
 def password_reset_request(request):
@@ -39,14 +39,7 @@ def password_reset_request(request):
                     'reset_url': reset_url,
                 })
 
-                email_to_be_sent = EmailMessage(
-                    email_subject,
-                    email_message,
-                    settings.EMAIL_HOST_USER,
-                    [email],  
-                )
-                email_to_be_sent.content_subtype = 'html'
-                email_to_be_sent.send()
+                outbox.enqueue(email_subject, email_message, [email], from_email=settings.EMAIL_HOST_USER, html=True)
 
                 return render(request, 'password_reset/sent.html')
 
@@ -0,0 +1,43 @@
+const slider1 = document.getElementById("review-rating-1");
+const slider2 = document.getElementById("review-rating-2");
+const slider3 = document.getElementById("review-rating-3");
+let output1 = document.getElementById("rating-value-1");
+let output2 = document.getElementById("rating-value-2");
+let output3 = document.getElementById("rating-value-3");
+const criteria = JSON.parse(document.getElementById('review-criteria').textContent);
+const problemSolvingDict = criteria.problem_solving;
+const communicationDict = criteria.communication;
+const sociabilityDict = criteria.sociability;
+slider1.oninput = function() {
+if(this.value == 0) {
+output1.innerHTML = ''
+}
+else {
+output1.innerHTML = `${problemSolvingDict[this.value].name} : ${problemSolvingDict[this.value].description}`;
+}
+}
+slider2.oninput = function() {
+if(this.value == 0) {
+output2.innerHTML = ''
+}
+else {
+output2.innerHTML = `${communicationDict[this.value].name} : ${communicationDict[this.value].description}`;
+}
+}
+slider3.oninput = function() {
+if(this.value == 0) {
+output3.innerHTML = ''
+}
+else {
+output3.innerHTML = `${sociabilityDict[this.value].name} : ${sociabilityDict[this.value].description}`;
+}
+}
+const validateRating = () => {
+var slider1 = document.getElementById("review-rating-1");
+var slider2 = document.getElementById("review-rating-2");
+var slider3 = document.getElementById("review-rating-3");
+if (slider1.value == 0 || slider2.value == 0 || slider3.value == 0) {
+alert("Please rate all the three categories. Move the sliders to choose the best description for each category.")
+event.preventDefault();
+}
+}
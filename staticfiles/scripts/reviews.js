@@ -0,0 +1,100 @@
+var reviewsConfig = document.currentScript.dataset;
+$(document).ready(function() {
+$(document).on('click', '.public_private', function() {
+var reviewId = $(this).data('review-id');
+var skill = $(this).data('skill');
+$.ajax({
+url: reviewsConfig.publicPrivateUrl,
+type: 'POST',
+data: {
+'review_id': reviewId,
+'skill': skill,
+'csrfmiddlewaretoken': reviewsConfig.csrfToken
+},
+success: function(response) {
+var skill_num = 0;
+if (response.skill == 'problem_solving'){
+skill_num = 1;
+}
+else if (response.skill == 'communication'){
+skill_num = 2;
+}
+else if (response.skill == 'sociability'){
+skill_num = 3;
+}
+var publicPrivateButton = $('#public-button-' + skill_num + '-' + response.review_id);
+if(response.bool_val == true){
+publicPrivateButton.addClass('used-public_private')
+publicPrivateButton.text('Make It Private')
+} else {
+publicPrivateButton.removeClass('used-public_private')
+publicPrivateButton.text('Make It Public')
+}
+},
+error: function(response) {
+console.log(response)
+}
+})
+})
+});
+$(document).ready(function() {
+$(document).on('click', '.vote-btn', function(e) {
+e.preventDefault();
+var reviewId = $(this).data('review-id');
+var action = $(this).data('action');
+var button = $(this);
+$.ajax({
+url: reviewsConfig.voteUrl,
+type: 'POST',
+data: {
+'review_id': reviewId,
+'action': action,
+'csrfmiddlewaretoken': reviewsConfig.csrfToken
+},
+success: function(response) {
+var upvoteCountElement = $('#upvote-count-' + response.review_id);
+upvoteCountElement.text(response.upvotes_count);
+var downvoteCountElement = $('#downvote-count-' + response.review_id);
+downvoteCountElement.text(response.downvotes_count);
+var upvoteButtonElement = $('#upvote-btn-' + response.review_id);
+var downvoteButtonElement = $('#downvote-btn-' + response.review_id);
+if (response.has_upvoted){
+upvoteButtonElement.addClass('used-vote-btn');
+downvoteButtonElement.removeClass('used-vote-btn');
+} else if (response.has_downvoted){
+downvoteButtonElement.addClass('used-vote-btn');
+upvoteButtonElement.removeClass('used-vote-btn');
+} else {
+upvoteButtonElement.removeClass('used-vote-btn');
+downvoteButtonElement.removeClass('used-vote-btn');
+}
+},
+error: function(response) {
+console.log(responseText)
+}
+});
+});
+});
+$(document).ready(function() {
+$('.load-more').click(function() {
+var button = $(this);
+$.ajax({
+url: button.data('url'),
+type: 'GET',
+data: {
+'after': button.attr('data-next'),
+},
+success: function(response) {
+$('#' + button.data('list')).append(response.html);
+if (response.next) {
+button.attr('data-next', response.next);
+} else {
+button.remove();
+}
+},
+error: function(response) {
+console.log(response)
+}
+});
+});
+});